@@ -3,6 +3,7 @@ from flask import Flask
 import os
 from scripts.auto_train_monitor import start_monitor
 from routes.route import register_routes
+from chatbot.knowledge_base import get_knowledge_base, start_ingester, start_model_watcher
 
 # ─────────────────────────────────────────────
 # 🔧 Démarrer le moniteur d'entraînement
@@ -14,6 +15,15 @@ try:
 except Exception as e:
     print(f"❌ Échec du démarrage du moniteur : {e}")
 
+# ─────────────────────────────────────────────
+# 🧠 Construire la base de connaissances partagée
+# ─────────────────────────────────────────────
+print("🧠 Construction de la base de connaissances partagée...")
+kb_stats = get_knowledge_base().stats()
+print(f"📏 Instantané : {kb_stats['build_seconds']}s de construction, ~{kb_stats['size_mb']} Mo en mémoire")
+start_model_watcher()
+start_ingester()
+
 # ─────────────────────────────────────────────
 # 🌐 Initialiser Flask
 # ─────────────────────────────────────────────
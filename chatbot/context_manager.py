@@ -0,0 +1,89 @@
+# chatbot/context_manager.py
+import re
+
+from config.settings import (
+    CONTEXT_WINDOW_MESSAGES, CONTEXT_MAX_CHARS, CONTEXT_SUMMARY_CHARS, CONTEXT_SUMMARY_ITEM_CHARS
+)
+from .knowledge_base import FALLBACK_KEYWORDS
+
+# Message porteur d'une information à garder en priorité dans le résumé (note, bac, bourse...)
+FACT_PATTERN = re.compile(r"\d|" + "|".join(map(re.escape, FALLBACK_KEYWORDS + ("moyenne", "budget", "ville"))),
+                          re.IGNORECASE)
+SUMMARY_SEPARATOR = " ; "
+
+
+def _shorten(text, limit):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def summarize(previous, messages, max_chars=CONTEXT_SUMMARY_CHARS, item_chars=CONTEXT_SUMMARY_ITEM_CHARS):
+    """
+    Résumé extractif cumulatif : ancien résumé + messages sortis de la fenêtre
+    (raccourcis, sans doublon). Au-delà de `max_chars`, les messages sans
+    information chiffrée ni mot-clé partent d'abord, puis les plus anciens.
+    """
+    items = previous.split(SUMMARY_SEPARATOR) if previous else []
+    for message in messages:
+        item = _shorten(message, item_chars)
+        if item and item not in items:
+            items.append(item)
+
+    def size(kept):
+        return sum(len(item) for item in kept) + len(SUMMARY_SEPARATOR) * max(len(kept) - 1, 0)
+
+    for droppable in (lambda item: not FACT_PATTERN.search(item), lambda item: True):
+        while size(items) > max_chars:
+            index = next((i for i, item in enumerate(items) if droppable(item)), None)
+            if index is None:
+                break
+            del items[index]
+    return SUMMARY_SEPARATOR.join(items)
+
+
+class ContextManager:
+    """
+    Contexte de conversation envoyé à Gemini, de taille constante quelle que soit
+    la longueur de la conversation : les `window` derniers messages du client, plus
+    un résumé courant des messages plus anciens. Le résumé est gardé dans l'état de
+    la session ([messages déjà résumés, texte]) et n'est mis à jour que lorsque des
+    messages sortent de la fenêtre.
+    """
+
+    def __init__(self, window=CONTEXT_WINDOW_MESSAGES, max_chars=CONTEXT_MAX_CHARS):
+        self.window = window
+        self.max_chars = max_chars
+
+    def update(self, state):
+        """Résume les messages sortis de la fenêtre depuis le dernier appel"""
+        evict_until = state.message_count - self.window  # index absolu du 1er message gardé
+        folded, text = state.summary or (0, "")
+        if evict_until <= folded:
+            return
+        history_start = state.message_count - len(state.client_messages)
+        evicted = state.client_messages[max(folded - history_start, 0):max(evict_until - history_start, 0)]
+        state.summary = [evict_until, summarize(text, evicted)]
+
+    def render(self, state, max_chars=None):
+        """
+        Contexte borné à `max_chars` caractères : résumé puis derniers messages.
+        Si le budget est dépassé, les messages les plus anciens de la fenêtre partent
+        d'abord, puis le résumé est tronqué ; le dernier message est toujours gardé.
+        """
+        max_chars = self.max_chars if max_chars is None else max_chars
+        recent = [f"Client: {message}" for message in state.client_messages[-self.window:]]
+        summary = state.summary[1] if state.summary else ""
+        header = f"Résumé des échanges précédents : {summary}" if summary else ""
+
+        def total(lines):
+            return sum(len(line) + 1 for line in lines)
+
+        while len(recent) > 1 and total([header] + recent) > max_chars:
+            recent.pop(0)
+        if header and total([header] + recent) > max_chars:
+            remaining = max_chars - total(recent) - 1
+            header = _shorten(header, remaining) if remaining >= 20 else ""
+        lines = ([header] if header else []) + recent
+        if lines and total(lines) > max_chars:
+            lines[-1] = _shorten(lines[-1], max(max_chars - 1, 1))
+        return "\n".join(lines)
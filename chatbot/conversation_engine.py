@@ -1,66 +1,292 @@
 # chatbot/conversation_engine.py
+import asyncio
 import json, os
+import threading
+import uuid
+from collections import namedtuple
 from datetime import datetime
+from functools import lru_cache
 from .response_retriever import ResponseRetriever
-from .gemini_assistant import GeminiAssistant
-from models.scoring_system import calculate_score_answer
+from .gemini_assistant import FALLBACK_TEXT, GeminiAssistant
+from .conversation_state import ConversationState
+from .context_manager import ContextManager
+from .prefetcher import get_prefetcher
+from .rephrasing_bank import get_rephrasing_bank
+from config.settings import REPHRASING_MODE
+from models.scoring_system import compile_matchers, qualification_status
 from models.predictor import StatusPredictor
 
+# Génération Gemini à lancer pour compléter une réponse (texte de repli si échec)
+# `context` : contexte de conversation borné (vide pour les reformulations de textes fixes, mises en cache)
+# `pending` : génération préchargée encore en cours (future), à attendre au lieu de relancer l'appel
+Generation = namedtuple("Generation", ["prompt", "fallback", "context", "pending"], defaults=("", None))
+
+_shared_modules = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_modules():
+    """
+    Modules IA partagés par toutes les sessions du processus :
+    (GeminiAssistant, ResponseRetriever, StatusPredictor)
+    """
+    global _shared_modules
+    if _shared_modules is None:
+        with _shared_lock:
+            if _shared_modules is None:
+                gemini = GeminiAssistant()
+                _shared_modules = (
+                    gemini,
+                    ResponseRetriever(gemini_assistant=gemini),
+                    StatusPredictor()
+                )
+    return _shared_modules
+
+
+@lru_cache(maxsize=None)
+def _read_questions(questions_file):
+    with open(questions_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def _question_matchers(questions_file):
+    """Matchers de mots-clés compilés une fois par fichier de questions"""
+    return compile_matchers(_read_questions(questions_file)["questions"])
+
+
+def _rephrase_prompt(text):
+    return f"Reformule naturellement : '{text}'"
+
+
 class QualificationChatbot:
-    def __init__(self, questions_file=None):
+    def __init__(self, questions_file=None, gemini=None, retriever=None, predictor=None, prefetcher=None):
         if questions_file is None:
             questions_file = os.path.join(os.path.dirname(__file__), "questions.json")
         self.questions_file = questions_file
         self.load_questions()
 
-        # État
-        self.client_score = 0
-        self.conversation_log = []
-        self.context = ""
-        self.client_messages = []
-        self.current_question_index = 0
-        self.phase = "service"
-        self.pending_question = None
+        # État (sérialisable, voir ConversationState)
+        self.state = ConversationState.new()
+
+        # Modules IA (partagés, la session ne garde que l'état de la conversation)
+        if gemini is None or retriever is None or predictor is None:
+            shared_gemini, shared_retriever, shared_predictor = get_shared_modules()
+            gemini, retriever, predictor = gemini or shared_gemini, retriever or shared_retriever, predictor or shared_predictor
+        self.gemini = gemini
+        self.retriever = retriever
+        self.predictor = predictor  # Pour prédire le statut
+        self.context_manager = ContextManager()  # Fenêtre + résumé envoyés à Gemini
+        self.prefetcher = prefetcher or get_prefetcher()  # Reformulations lancées en avance (ou None)
+        self.session_id = uuid.uuid4().hex  # remplacé par la clé du store (voir routes.route.get_session)
+
+    # 🔁 Accès à l'état de la conversation
+    @property
+    def client_score(self):
+        return self.state.client_score
+
+    @client_score.setter
+    def client_score(self, value):
+        self.state.client_score = value
+
+    @property
+    def current_question_index(self):
+        return self.state.current_question_index
+
+    @current_question_index.setter
+    def current_question_index(self, value):
+        self.state.current_question_index = value
+
+    @property
+    def phase(self):
+        return self.state.phase
+
+    @phase.setter
+    def phase(self, value):
+        self.state.phase = value
+
+    @property
+    def pending_question(self):
+        index = self.state.pending_index
+        return self.questions[index] if index is not None else None
+
+    @pending_question.setter
+    def pending_question(self, question):
+        self.state.pending_index = self.questions.index(question) if question is not None else None
+
+    @property
+    def client_messages(self):
+        return self.state.client_messages
+
+    @property
+    def context(self):
+        return self.context_manager.render(self.state)
+
+    @property
+    def conversation_log(self):
+        return [
+            {"timestamp": timestamp, "sender": sender, "text": text}
+            for timestamp, sender, text in self.state.conversation_log
+        ]
+
+    def export_state(self):
+        """Sérialise l'état de la conversation (les modules IA partagés ne sont pas inclus)"""
+        return self.state.to_bytes()
 
-        # Modules IA
-        self.gemini = GeminiAssistant()
-        self.retriever = ResponseRetriever(gemini_assistant=self.gemini)
-        self.predictor = StatusPredictor()  # Pour prédire le statut
+    @classmethod
+    def from_state(cls, raw, questions_file=None):
+        """Recrée une session à partir de export_state()"""
+        chatbot = cls(questions_file)
+        chatbot.state = ConversationState.from_bytes(raw)
+        return chatbot
 
     def load_questions(self):
         try:
-            with open(self.questions_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.questions = data["questions"]
-                self.threshold = data.get("qualification_threshold", 60)
-                self.greeting = data.get("greeting_tn", "Salam !")
-                self.final_qualified = data.get("final_qualified_tn", "✅ Mabrouk !")
-                self.final_followup = data.get("final_followup_tn", "ℹ️ À suivre…")
-                self.final_not_qualified = data.get("final_not_qualified_tn", "❌ Non qualifié.")
+            data = _read_questions(self.questions_file)
+            self.questions = data["questions"]
+            self.matchers = _question_matchers(self.questions_file)
+            self.threshold = data.get("qualification_threshold", 60)
+            self.greeting = data.get("greeting_tn", "Salam !")
+            self.final_qualified = data.get("final_qualified_tn", "✅ Mabrouk !")
+            self.final_followup = data.get("final_followup_tn", "ℹ️ À suivre…")
+            self.final_not_qualified = data.get("final_not_qualified_tn", "❌ Non qualifié.")
         except Exception as e:
             print(f"❌ Erreur de chargement des questions : {e}")
             raise
 
+    def release(self):
+        """Session abandonnée (ou questionnaire terminé) : annule les préchargements non utilisés"""
+        if self.prefetcher is not None:
+            self.prefetcher.discard(self.session_id)
+
+    @staticmethod
+    def _bank_variant(text):
+        return get_rephrasing_bank().get(text) if REPHRASING_MODE == "bank" else None
+
+    def _rephrase(self, text):
+        """
+        Reformulation d'une question fixe : (variante de la banque ou préchargée, None)
+        si disponible, sinon (None, génération avec le texte original en repli) —
+        la génération attend le préchargement s'il est encore en cours.
+        """
+        variant = self._bank_variant(text)
+        if variant:
+            return variant, None
+        prefetched = self.prefetcher.take(self.session_id, text) if self.prefetcher else None
+        if prefetched is not None and prefetched.done():
+            return prefetched.result(), None
+        return None, Generation(_rephrase_prompt(text), text, pending=prefetched)
+
+    def _prefetch_next_question(self):
+        """
+        La question suivante est connue dès que la question courante est posée :
+        sa reformulation est lancée en arrière-plan pendant que le client répond
+        """
+        index = self.current_question_index + 1
+        if self.prefetcher is None or index >= len(self.questions):
+            return
+        text = self.questions[index]["text_tn"]
+        if self._bank_variant(text) is None:
+            prompt = _rephrase_prompt(text)
+            self.prefetcher.submit(self.session_id, text, lambda: self._prefetch_rephrase(prompt))
+
+    def _prefetch_rephrase(self, prompt):
+        """Tâche de préchargement : le texte de repli de Gemini (appel en échec) est une erreur pour le Prefetcher"""
+        text = self.gemini.generate_response(prompt)
+        if text == FALLBACK_TEXT:
+            raise RuntimeError("Gemini indisponible : reformulation non préchargée")
+        return text
+
+    def _generate(self, generation):
+        """Texte généré, ou le repli de la génération (texte original) si Gemini est en échec"""
+        try:
+            if generation.pending is not None:
+                text = generation.pending.result()
+            else:
+                text = self.gemini.generate_response(generation.prompt, generation.context)
+        except:
+            return generation.fallback
+        return generation.fallback if text == FALLBACK_TEXT else text
+
+    def _final_message(self, text):
+        """Message final : une variante de la banque si disponible, sinon le texte tel quel"""
+        if REPHRASING_MODE == "bank":
+            return get_rephrasing_bank().get(text) or text
+        return text
+
     def _is_qualification_request(self, user_message):
         triggers = [
             "bourse", "scholarship", "qualifié", "eligible", "chance",
             "score", "moyenne", "10 wla akther", "bac", "baccalauréat",
             "est-ce que je peux", "puis-je", "je suis eligible", "je peux avoir"
         ]
-        return any(trigger in user_message.lower() for trigger)
+        return any(trigger in user_message.lower() for trigger in triggers)
 
     def _is_rejecting_qualification(self, user_message):
         return any(word in user_message.lower() for word in ["non respond", "repond", "ignore", "pas maintenant"])
 
     def process_message(self, user_message):
+        response_data, generation = self._prepare_reply(user_message)
+        if generation:
+            response_data["response"] = self._generate(generation)
+        return response_data
+
+    def stream_message(self, user_message):
+        """
+        Comme process_message, mais en flux : ("meta", données sans le texte) dès que
+        l'état est mis à jour, puis ("token", morceau)..., puis ("done", données complètes).
+        """
+        response_data, generation = self._prepare_reply(user_message)
+        yield "meta", {k: v for k, v in response_data.items() if k != "response"}
+
+        if generation is None:
+            yield "token", response_data["response"]
+        else:
+            chunks = []
+            try:
+                chunks_source = (
+                    [generation.pending.result()] if generation.pending is not None
+                    else self.gemini.stream_response(generation.prompt, generation.context)
+                )
+                for chunk in chunks_source:
+                    if not chunks and chunk == FALLBACK_TEXT:
+                        break  # Gemini en échec : repli de la génération
+                    chunks.append(chunk)
+                    yield "token", chunk
+            except:
+                pass
+            if not chunks:
+                chunks.append(generation.fallback)
+                yield "token", generation.fallback
+            response_data["response"] = "".join(chunks).strip()
+        yield "done", response_data
+
+    async def aprocess_message(self, user_message):
+        """
+        Version asynchrone : la partie locale (scoring, recherche) tourne dans un thread,
+        l'appel Gemini est attendu sans bloquer la boucle d'événements (sous Flask/WSGI,
+        le thread de la requête reste néanmoins occupé jusqu'à la réponse).
+        """
+        response_data, generation = await asyncio.to_thread(self._prepare_reply, user_message)
+        if generation:
+            try:
+                if generation.pending is not None:
+                    text = await asyncio.wrap_future(generation.pending)
+                else:
+                    text = await self.gemini.agenerate_response(generation.prompt, generation.context)
+                response_data["response"] = generation.fallback if text == FALLBACK_TEXT else text
+            except:
+                response_data["response"] = generation.fallback
+        return response_data
+
+    def _prepare_reply(self, user_message):
+        """
+        Met à jour l'état et prépare la réponse. Retourne (données, génération) :
+        si une génération Gemini est nécessaire, c'est à l'appelant de la lancer.
+        """
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.conversation_log.append({
-            "timestamp": timestamp,
-            "sender": "user",
-            "text": user_message
-        })
-        self.context += f"\nClient: {user_message}"
-        self.client_messages.append(user_message)
+        self.state.add_client_message(user_message, timestamp)
+        self.context_manager.update(self.state)
 
         response_data = {
             "response": "",
@@ -70,16 +296,17 @@ class QualificationChatbot:
             "phase": self.phase
         }
 
-        # 🔮 Prédiction IA
-        if len(self.client_messages) >= 2 and self.predictor.is_loaded:
-            partial = " ||| ".join(self.client_messages)
-            status, confidence = self.predictor.predict(partial)
-            response_data["prediction"] = {"status": status, "confidence": float(confidence)}
+        # 🔮 Prédiction IA (vecteur de features mis à jour avec le seul nouveau message)
+        if self.predictor.is_loaded:
+            self.state.features = self.predictor.update_features(self.state.features, self.client_messages)
+            if self.state.message_count >= 2:
+                status, confidence = self.predictor.predict_features([self.state.features])[0]
+                response_data["prediction"] = {"status": status, "confidence": float(confidence)}
 
         # PHASE 1 : Greeting
-        if len(self.client_messages) == 1:
+        if self.state.message_count == 1:
             response_data["response"] = self.greeting
-            return response_data
+            return response_data, None
 
         # PHASE 2 : Refus de qualification
         if self._is_rejecting_qualification(user_message):
@@ -90,25 +317,23 @@ class QualificationChatbot:
                     self.pending_question = None
                 else:
                     response_data["response"] = "On va te répondre bientôt, merci pour ta patience !"
-            return response_data
+            return response_data, None
 
         # PHASE 3 : Démarrer qualification
         if self.phase == "service" and self._is_qualification_request(user_message):
             self.phase = "qualification"
             self.current_question_index = 0
-            next_q = self.questions[0]["text_tn"]
-            prompt = f"Reformule naturellement : '{next_q}'"
-            try:
-                response_data["response"] = self.gemini.generate_response(prompt)
-            except:
-                response_data["response"] = next_q
-            return response_data
+            response_data["response"], generation = self._rephrase(self.questions[0]["text_tn"])
+            self._prefetch_next_question()
+            return response_data, generation
 
         # PHASE 4 : Qualification
         if self.phase == "qualification":
             if self.current_question_index < len(self.questions):
-                q = self.questions[self.current_question_index]
-                points = calculate_score_answer(q, user_message)
+                matcher = self.matchers[self.current_question_index]
+                match = matcher.best_match(user_message)
+                points = match.score if match else matcher.default_score
+                response_data["keyword_match"] = match._asdict() if match else None  # audit du score
                 self.client_score += points
                 response_data["score"] = self.client_score
 
@@ -117,37 +342,30 @@ class QualificationChatbot:
                 if self.current_question_index < len(self.questions):
                     next_q = self.questions[self.current_question_index]["text_tn"]
                     self.pending_question = self.questions[self.current_question_index]
-                    prompt = f"Reformule naturellement : '{next_q}'"
-                    try:
-                        response_data["response"] = self.gemini.generate_response(prompt)
-                    except:
-                        response_data["response"] = next_q
+                    response_data["response"], generation = self._rephrase(next_q)
+                    self._prefetch_next_question()
+                    return response_data, generation
                 else:
-                    if self.client_score >= self.threshold:
-                        final_msg = self.final_qualified
-                        final_status = "Qualified"
-                    elif self.client_score >= self.threshold * 0.5:
-                        final_msg = self.final_followup
-                        final_status = "To follow up"
-                    else:
-                        final_msg = self.final_not_qualified
-                        final_status = "Unqualified"
-
-                    response_data["response"] = f"{final_msg}\n📊 Score final: {self.client_score}"
+                    final_status = qualification_status(self.client_score, self.threshold)
+                    final_msg = {
+                        "Qualified": self.final_qualified,
+                        "To follow up": self.final_followup,
+                        "Unqualified": self.final_not_qualified,
+                    }[final_status]
+
+                    response_data["response"] = f"{self._final_message(final_msg)}\n📊 Score final: {self.client_score}"
                     response_data["status"] = final_status
                     self.phase = "post_qualification"
-            return response_data
+                    self.release()
+            return response_data, None
 
         # PHASE 5 : Post-qualification ou service
         if self.phase in ["service", "post_qualification"]:
-            answer = self.retriever.find_response(user_message)
+            # Le contexte sert au fallback Gemini (réponse à composer) ; la reformulation
+            # d'une réponse déjà choisie reste sans contexte pour rester en cache
+            answer = self.retriever.find_response(user_message, self.context)
             if answer:
-                prompt = f"Reformule en tunisien latin naturel : '{answer}'"
-                try:
-                    response_data["response"] = self.gemini.generate_response(prompt)
-                except:
-                    response_data["response"] = answer
-            else:
-                response_data["response"] = "On va te répondre bientôt, merci pour ta patience !"
+                return response_data, Generation(f"Reformule en tunisien latin naturel : '{answer}'", answer)
+            response_data["response"] = "On va te répondre bientôt, merci pour ta patience !"
 
-        return response_data
\ No newline at end of file
+        return response_data, None
\ No newline at end of file
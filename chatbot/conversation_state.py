@@ -0,0 +1,60 @@
+# chatbot/conversation_state.py
+import json
+from dataclasses import dataclass
+
+from config.settings import CONVERSATION_MAX_HISTORY
+
+# Version du format sérialisé (à incrémenter si les champs changent)
+STATE_VERSION = 3
+
+
+@dataclass
+class ConversationState:
+    """
+    État d'une conversation, séparé des modules IA partagés.
+    Compact (__slots__) et sérialisable en JSON pour être persisté entre workers.
+    """
+    __slots__ = (
+        "client_score", "current_question_index", "phase", "pending_index",
+        "message_count", "client_messages", "conversation_log", "features", "summary"
+    )
+    client_score: int
+    current_question_index: int
+    phase: str
+    pending_index: object  # index de la question en attente, ou None
+    message_count: int  # nombre total de messages client (l'historique, lui, est borné)
+    client_messages: list
+    conversation_log: list  # [[timestamp, sender, text], ...]
+    features: object  # vecteur de comptes incrémental du prédicteur (voir StatusPredictor), ou None
+    summary: object  # [messages déjà résumés, résumé] des messages hors fenêtre (voir ContextManager), ou None
+
+    @classmethod
+    def new(cls):
+        return cls(0, 0, "service", None, 0, [], [], None, None)
+
+    def add_client_message(self, text, timestamp, max_history=CONVERSATION_MAX_HISTORY):
+        self.message_count += 1
+        self.client_messages.append(text)
+        self.conversation_log.append([timestamp, "user", text])
+        if len(self.client_messages) > max_history:
+            del self.client_messages[:-max_history]
+        if len(self.conversation_log) > max_history:
+            del self.conversation_log[:-max_history]
+
+    def to_bytes(self):
+        return json.dumps([
+            STATE_VERSION, self.client_score, self.current_question_index, self.phase,
+            self.pending_index, self.message_count, self.client_messages, self.conversation_log,
+            self.features, self.summary
+        ], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, raw):
+        version, *fields = json.loads(raw)
+        if version not in (1, 2, STATE_VERSION):
+            raise ValueError(f"❌ Version d'état de conversation inconnue : {version}")
+        if version == 1:
+            fields.append(None)  # sessions d'avant le vecteur incrémental : recalculé au prochain message
+        if version <= 2:
+            fields.append(None)  # sessions d'avant le résumé : construit quand des messages sortent de la fenêtre
+        return cls(*fields)
@@ -0,0 +1,232 @@
+# chatbot/dense_index.py
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+from config.settings import LSA_COMPONENTS, ANN_BACKEND, ANN_MIN_ITEMS, ANN_NPROBE, ANN_EF_SEARCH
+
+try:
+    import hnswlib  # index HNSW (optionnel)
+except ImportError:
+    hnswlib = None
+
+
+def top_k(scores, k):
+    """
+    Indices des k meilleurs scores (décroissants, égalités → plus petit index).
+    Partagé par la recherche exacte (ResponseRetriever) et les index denses.
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k == 1:
+        return np.array([np.argmax(scores)])
+    if k < scores.shape[0]:
+        # Toutes les égalités avec le k-ième score : argpartition en choisit une au hasard
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(k)
+    return candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+
+
+class LsaEncoder:
+    """
+    Projection LSA (TruncatedSVD) de l'espace TF-IDF du vectoriseur vers des
+    vecteurs denses float32 normalisés L2 : deux questions proches sans terme
+    commun (mais avec des termes qui apparaissent ensemble dans la base) ont
+    un cosinus non nul.
+    """
+
+    def __init__(self, components):
+        # (nb_features × dimensions), contigu et float32 comme les requêtes : une ligne
+        # creuse × projection ne lit que les lignes de ses termes, sans conversion
+        self.projection = np.ascontiguousarray(np.asarray(components, dtype=np.float32).T)
+
+    @classmethod
+    def fit(cls, tfidf_vectors, n_components=LSA_COMPONENTS, random_state=42):
+        n_components = max(1, min(n_components, tfidf_vectors.shape[0] - 1, tfidf_vectors.shape[1] - 1))
+        svd = TruncatedSVD(n_components=n_components, algorithm="randomized", random_state=random_state)
+        svd.fit(tfidf_vectors)
+        return cls(svd.components_)
+
+    @property
+    def dimensions(self):
+        return self.projection.shape[1]
+
+    def transform(self, tfidf_vectors):
+        dense = np.asarray(tfidf_vectors.astype(np.float32) @ self.projection)
+        return normalize(dense, norm="l2", copy=False)
+
+
+class ExactSearch:
+    """Recherche exhaustive (produit matriciel) : référence pour mesurer le rappel"""
+    name = "exact"
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    @property
+    def nbytes(self):
+        return 0  # parcourt directement les vecteurs de DenseIndex
+
+    def search(self, query, k):
+        scores = self.embeddings @ query
+        return top_k(scores, k)
+
+    def extend(self, embeddings, start):
+        return ExactSearch(embeddings)
+
+
+class IvfSearch:
+    """
+    Index IVF intégré : k-means sphérique sur les vecteurs, chaque requête ne
+    parcourt que les `nprobe` listes dont le centroïde est le plus proche.
+    Les vecteurs sont rangés liste par liste (tableau contigu par liste).
+    """
+    name = "ivf"
+
+    def __init__(self, centroids, assignments, embeddings, nprobe=ANN_NPROBE):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.nprobe = min(nprobe, len(centroids))
+        order = np.argsort(assignments, kind="stable")
+        self.order = order
+        self.vectors = np.ascontiguousarray(embeddings[order])
+        self.offsets = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))
+
+    @classmethod
+    def build(cls, embeddings, nprobe=ANN_NPROBE, random_state=42):
+        n_lists = max(1, int(np.sqrt(len(embeddings))))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=random_state, n_init=3,
+                                 batch_size=min(1024, len(embeddings)))
+        assignments = kmeans.fit_predict(embeddings)
+        centroids = normalize(kmeans.cluster_centers_.astype(np.float32), norm="l2")
+        return cls(centroids, assignments, embeddings, nprobe)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.centroids, self.assignments, self.order, self.vectors, self.offsets))
+
+    def _lists(self, query):
+        return top_k(self.centroids @ query, self.nprobe)
+
+    def search(self, query, k):
+        ranges = [np.arange(self.offsets[c], self.offsets[c + 1]) for c in self._lists(query)]
+        positions = np.concatenate(ranges) if ranges else np.empty(0, dtype=np.intp)
+        scores = self.vectors[positions] @ query
+        # Égalités départagées par l'index d'origine, comme la recherche exacte
+        ids = self.order[positions]
+        best = np.lexsort((ids, -scores))[:k]
+        return ids[best]
+
+    def extend(self, embeddings, start):
+        new_assignments = np.argmax(embeddings[start:] @ self.centroids.T, axis=1)
+        return IvfSearch(self.centroids, np.concatenate([self.assignments, new_assignments]),
+                         embeddings, self.nprobe)
+
+
+class HnswSearch:
+    """Index HNSW (hnswlib), produit scalaire sur vecteurs normalisés = cosinus"""
+    name = "hnsw"
+
+    def __init__(self, index, size):
+        self.index = index
+        self.size = size  # éléments visibles par cet instantané (l'index natif est partagé)
+
+    @classmethod
+    def build(cls, embeddings, ef_search=ANN_EF_SEARCH, capacity=None):
+        index = hnswlib.Index(space="ip", dim=embeddings.shape[1])
+        index.init_index(max_elements=capacity or max(2 * len(embeddings), 1024), ef_construction=200, M=16)
+        index.add_items(embeddings, np.arange(len(embeddings)))
+        index.set_ef(ef_search)
+        return cls(index, len(embeddings))
+
+    @property
+    def nbytes(self):
+        # Estimation (index natif) : vecteur float32 + liens du niveau 0 (2 × M) + étiquette
+        return self.size * (self.index.dim * 4 + 2 * 16 * 4 + 8)
+
+    def search(self, query, k):
+        k = min(k, self.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        labels, _ = self.index.knn_query(query, k=k)
+        # Éléments ajoutés pour un instantané plus récent : ignorés ici
+        return labels[0][labels[0] < self.size].astype(np.intp)
+
+    def extend(self, embeddings, start):
+        if len(embeddings) > self.index.get_max_elements():
+            # resize_index n'est pas sûr pendant les recherches : reconstruction
+            return HnswSearch.build(embeddings, capacity=2 * len(embeddings))
+        self.index.add_items(embeddings[start:], np.arange(start, len(embeddings)))
+        return HnswSearch(self.index, len(embeddings))
+
+
+def _build_search(embeddings, backend):
+    if backend == "auto":
+        # Petite base : le parcours exhaustif est aussi rapide et exact
+        if len(embeddings) < ANN_MIN_ITEMS:
+            backend = "exact"
+        else:
+            backend = "hnsw" if hnswlib is not None else "ivf"
+    if backend == "hnsw":
+        if hnswlib is None:
+            raise ImportError("❌ ANN_BACKEND=hnsw nécessite hnswlib (pip install hnswlib)")
+        return HnswSearch.build(embeddings)
+    if backend == "ivf":
+        return IvfSearch.build(embeddings)
+    return ExactSearch(embeddings)
+
+
+class DenseIndex:
+    """
+    Vecteurs LSA des questions de la base (float32, tableau contigu) + index de
+    plus proches voisins. Immuable comme l'instantané qui le porte : `extend`
+    retourne un nouvel index.
+    """
+
+    def __init__(self, encoder, embeddings, search):
+        self.encoder = encoder
+        self.embeddings = embeddings
+        self._search = search
+
+    @classmethod
+    def build(cls, tfidf_vectors, backend=ANN_BACKEND, n_components=LSA_COMPONENTS):
+        encoder = LsaEncoder.fit(tfidf_vectors, n_components)
+        embeddings = np.ascontiguousarray(encoder.transform(tfidf_vectors))
+        return cls(encoder, embeddings, _build_search(embeddings, backend))
+
+    @property
+    def backend(self):
+        return self._search.name
+
+    @property
+    def nbytes(self):
+        return self.encoder.projection.nbytes + self.embeddings.nbytes + self._search.nbytes
+
+    def with_backend(self, backend):
+        """Même projection, autre index (ex. "exact" pour vérifier le rappel)"""
+        return DenseIndex(self.encoder, self.embeddings, _build_search(self.embeddings, backend))
+
+    def encode(self, tfidf_vectors):
+        return self.encoder.transform(tfidf_vectors)
+
+    def search(self, query_embeddings, k):
+        """Pour chaque requête : (indices, cosinus exacts) des k questions les plus proches"""
+        results = []
+        for query in query_embeddings:
+            indices = self._search.search(query, k)
+            results.append((indices, self.embeddings[indices] @ query))
+        return results
+
+    def similarities(self, query_embedding, indices):
+        """Cosinus exacts entre une requête et une sélection de questions"""
+        return self.embeddings[indices] @ query_embedding
+
+    def extend(self, tfidf_vectors):
+        """Nouvel index avec les questions ajoutées (projection inchangée)"""
+        start = len(self.embeddings)
+        embeddings = np.ascontiguousarray(np.vstack([self.embeddings, self.encode(tfidf_vectors)]))
+        return DenseIndex(self.encoder, embeddings, self._search.extend(embeddings, start))
@@ -1,70 +1,181 @@
 # chatbot/gemini_assistant.py
-import requests
-from config.settings import GEMINI_API_KEY
+import asyncio
+from config.settings import GEMINI_API_KEY, GEMINI_API_URL, GEMINI_CACHE_ENABLED, GEMINI_PROMPT_MAX_CHARS
+from .http_client import get_http_client
+from .response_cache import ResponseCache
 import json
 
+try:
+    import httpx  # client asynchrone (optionnel)
+except ImportError:
+    httpx = None
+
 # 🔗 URL de l'API Gemini (REST)
-API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+API_URL = GEMINI_API_URL
+STREAM_API_URL = API_URL.replace(":generateContent", ":streamGenerateContent")
+
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "maxOutputTokens": 500,
+    "topP": 0.95,
+    "topK": 40
+}
+
+# Réponse de repli quand l'API échoue (jamais mise en cache)
+FALLBACK_TEXT = "N7eb net2akd m3a l'équipe w n3awdou n9olk"
+
+# Instructions fixes : envoyées une fois par appel (systemInstruction), jamais
+# répétées dans le prompt ni imbriquées autour d'un prompt qui a les siennes
+SYSTEM_INSTRUCTION = f"""Tu es un conseiller académique pour des études en Malaisie.
+Tu échanges avec un étudiant tunisien qui écrit en dialecte.
+
+Règles :
+- Réponds en tunisien latin (pas en arabe ni en français formel)
+- Sois naturel, proche du langage parlé (ex: "ya", "belehi", "n7eb")
+- Si tu ne connais pas la réponse, dis "{FALLBACK_TEXT}"
+- Ne donne pas d'informations fausses
+- Garde un ton professionnel mais chaleureux
+
+Réponds UNIQUEMENT avec la réponse, pas d'explication."""
+
 
 class GeminiAssistant:
-    def __init__(self):
+    def __init__(self, cache=None, http_client=None):
         self.api_key = GEMINI_API_KEY
         if not self.api_key:
             raise ValueError("❌ GEMINI_API_KEY non trouvée dans .env")
+        if cache is None and GEMINI_CACHE_ENABLED:
+            cache = ResponseCache()
+        self.cache = cache or None  # cache=False → pas de cache
+        self.http = http_client or get_http_client()
 
-    def _call_api(self, prompt):
-        """
-        Appelle l'API Gemini via REST
-        """
-        headers = {
-            "Content-Type": "application/json"
-        }
+    @staticmethod
+    def _payload(prompt, instruction=None):
         data = {
             "contents": [{
                 "parts": [{"text": prompt}]
             }],
-            "generationConfig": {
-                "temperature": 0.7,
-                "maxOutputTokens": 500,
-                "topP": 0.95,
-                "topK": 40
-            }
+            "generationConfig": GENERATION_CONFIG
         }
+        if instruction:
+            data["systemInstruction"] = {"parts": [{"text": instruction}]}
+        return data
+
+    def _request(self, prompt, instruction=None):
+        """
+        Appelle l'API Gemini via REST (lève une exception en cas d'échec).
+        Connexions réutilisées, tentatives et disjoncteur : voir PooledHttpClient.
+        """
+        result = self.http.post_json(API_URL, self._payload(prompt, instruction), params={"key": self.api_key})
+        return self._extract_text(result).strip()
+
+    @staticmethod
+    def _extract_text(result):
+        candidates = result.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    def _cached(self, prompt, instruction=None, cacheable=True):
+        """
+        (clé, réponse en cache ou None) — clé None si le cache est désactivé ou si le
+        prompt ne peut pas revenir (contexte de conversation : une entrée par échange)
+        """
+        if self.cache is None or not cacheable:
+            return None, None
+        key = self.cache.make_key(f"{instruction}\n\n{prompt}" if instruction else prompt, GENERATION_CONFIG)
+        return key, self.cache.get(key)
+
+    def _call_api(self, prompt, instruction=None, cacheable=True):
+        """
+        Appelle l'API Gemini, en passant d'abord par le cache (instructions + prompt normalisé + config)
+        """
+        key, cached = self._cached(prompt, instruction, cacheable)
+        if cached is not None:
+            return cached
 
         try:
-            response = requests.post(
-                f"{API_URL}?key={self.api_key}",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result["candidates"][0]["content"]["parts"][0]["text"].strip()
+            text = self._request(prompt, instruction)
         except Exception as e:
             print(f"❌ Erreur API Gemini : {e}")
-            return "N7eb net2akd m3a l'équipe w n3awdou n9olk"
+            return FALLBACK_TEXT
+
+        if key is not None:
+            self.cache.put(key, text)
+        return text
+
+    @staticmethod
+    def build_prompt(question, context="", max_chars=GEMINI_PROMPT_MAX_CHARS):
+        """
+        Partie variable du prompt : contexte de la conversation (déjà résumé et borné
+        par ContextManager) puis la demande, sans les instructions fixes. Au-delà de
+        `max_chars`, le contexte perd ses lignes les plus anciennes ; la demande est
+        toujours envoyée en entier.
+        """
+        header = "Contexte de la conversation :\n"
+        room = max_chars - len(question) - len(header) - 2
+        if context and room > 0 and len(context) > room:
+            context = context[-room:].split("\n", 1)[-1]
+        if not context or room <= 0:
+            return question
+        return f"{header}{context}\n\n{question}"
 
-    def generate_response(self, question, context=""):
+    def generate_response(self, question, context="", instruction=SYSTEM_INSTRUCTION):
         """
-        Génère une réponse en tunisien latin basée sur le contexte
+        Génère une réponse en tunisien latin basée sur le contexte.
+        `instruction` : bloc d'instructions fixes de l'appel (un prompt qui porte
+        ses propres règles passe les siennes à la place de SYSTEM_INSTRUCTION).
         """
-        prompt = f"""
-        Tu es un conseiller académique pour des études en Malaisie.
-        Un étudiant tunisien te pose cette question en dialecte :
-        "{question}"
-
-        Contexte de la conversation :
-        {context}
-
-        Règles :
-        - Réponds en tunisien latin (pas en arabe ni en français formel)
-        - Sois naturel, proche du langage parlé (ex: "ya", "belehi", "n7eb")
-        - Si tu ne connais pas la réponse, dis "N7eb net2akd m3a l'équipe w n3awdou n9olk"
-        - Ne donne pas d'informations fausses
-        - Garde un ton professionnel mais chaleureux
-
-        Réponds UNIQUEMENT avec la réponse, pas d'explication.
+        return self._call_api(self.build_prompt(question, context), instruction, cacheable=not context)
+
+    def stream_response(self, question, context="", instruction=SYSTEM_INSTRUCTION):
+        """
+        Comme generate_response, mais produit la réponse morceau par morceau
+        (API streamGenerateContent en SSE). Réponse en cache → un seul morceau.
         """
+        prompt = self.build_prompt(question, context)
+        key, cached = self._cached(prompt, instruction, cacheable=not context)
+        if cached is not None:
+            yield cached
+            return
+
+        data = self._payload(prompt, instruction)
+        chunks = []
+        try:
+            for event in self.http.post_stream(STREAM_API_URL, data, params={"key": self.api_key, "alt": "sse"}):
+                text = self._extract_text(event)
+                if text:
+                    chunks.append(text)
+                    yield text
+        except Exception as e:
+            print(f"❌ Erreur API Gemini (stream) : {e}")
+            if not chunks:
+                yield FALLBACK_TEXT
+            return
+
+        if key is not None and chunks:
+            self.cache.put(key, "".join(chunks).strip())
+
+    async def agenerate_response(self, question, context="", instruction=SYSTEM_INSTRUCTION):
+        """
+        Version asynchrone de generate_response (httpx, client partagé du processus) :
+        ne bloque pas la boucle de l'appelant, mêmes tentatives et même disjoncteur que
+        la version synchrone. Sans httpx, l'appel synchrone part dans un thread.
+        """
+        if httpx is None:
+            return await asyncio.to_thread(self.generate_response, question, context, instruction)
+
+        prompt = self.build_prompt(question, context)
+        key, cached = self._cached(prompt, instruction, cacheable=not context)
+        if cached is not None:
+            return cached
+
+        try:
+            result = await self.http.apost_json(API_URL, self._payload(prompt, instruction), params={"key": self.api_key})
+            text = self._extract_text(result).strip()
+        except Exception as e:
+            print(f"❌ Erreur API Gemini : {e}")
+            return FALLBACK_TEXT
 
-        return self._call_api(prompt)
\ No newline at end of file
+        if key is not None:
+            self.cache.put(key, text)
+        return text
\ No newline at end of file
@@ -0,0 +1,330 @@
+# chatbot/http_client.py
+import asyncio
+import atexit
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx  # client asynchrone (optionnel)
+except ImportError:
+    httpx = None
+
+from config.settings import (
+    GEMINI_CONNECT_TIMEOUT, GEMINI_READ_TIMEOUT, GEMINI_MAX_RETRIES,
+    GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX, GEMINI_POOL_SIZE,
+    GEMINI_BREAKER_THRESHOLD, GEMINI_BREAKER_RESET
+)
+
+# Statuts HTTP pour lesquels une nouvelle tentative a du sens
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Le disjoncteur est ouvert : l'appel n'est même pas tenté"""
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur simple : après `failure_threshold` échecs consécutifs, il s'ouvre
+    pendant `reset_timeout` secondes, puis laisse passer un appel d'essai (half-open).
+    """
+
+    def __init__(self, failure_threshold=GEMINI_BREAKER_THRESHOLD, reset_timeout=GEMINI_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = 0  # numéro de l'essai half-open en cours (0 : aucun)
+        self._trials = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Autorisation d'appel : True (fermé), numéro de l'essai (half-open) ou False"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_in_flight:
+                self._trials += 1
+                self.trial_in_flight = self._trials
+                return self._trials
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = 0
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release(self, permit):
+        """
+        Fin d'un appel autorisé par allow(), quelle qu'en soit l'issue (à appeler dans un
+        finally) : un essai interrompu sans résultat (client SSE déconnecté, tâche annulée)
+        libère sa place, sinon le disjoncteur refuserait tout jusqu'au redémarrage.
+        """
+        with self._lock:
+            if permit is not True and self.trial_in_flight == permit:
+                self.trial_in_flight = 0
+
+
+class LatencyHistogram:
+    """Histogramme cumulatif des latences (bornes en secondes)"""
+    BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf"))
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.total += 1
+            self.sum += seconds
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.BUCKETS, self.counts):
+                cumulative += count
+                buckets["+Inf" if bound == float("inf") else f"le_{bound}s"] = cumulative
+            return {
+                "count": self.total,
+                "avg_seconds": round(self.sum / self.total, 4) if self.total else 0.0,
+                "buckets": buckets,
+            }
+
+
+class PooledHttpClient:
+    """
+    Client HTTP partagé : pool de connexions keep-alive (requests.Session),
+    timeouts connect/read séparés, tentatives bornées avec backoff exponentiel
+    à jitter sur 429/5xx et erreurs réseau, disjoncteur et histogramme de latence.
+    Variante asynchrone (apost_json, httpx) avec la même politique et le même disjoncteur.
+    """
+
+    def __init__(self, connect_timeout=GEMINI_CONNECT_TIMEOUT, read_timeout=GEMINI_READ_TIMEOUT,
+                 max_retries=GEMINI_MAX_RETRIES, backoff_base=GEMINI_BACKOFF_BASE,
+                 backoff_max=GEMINI_BACKOFF_MAX, pool_size=GEMINI_POOL_SIZE, breaker=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyHistogram()
+        self.retries = 0
+        self.short_circuited = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.pool_size = pool_size
+        self._async = None  # (boucle dédiée, httpx.AsyncClient), créés au premier appel asynchrone
+        self._async_lock = threading.Lock()
+
+    def _backoff(self, attempt, response=None):
+        # Retry-After (en secondes) si le serveur le fournit, sinon "full jitter"
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _permit(self):
+        permit = self.breaker.allow()
+        if not permit:
+            self.short_circuited += 1
+            raise CircuitOpenError("❌ Disjoncteur ouvert : API Gemini indisponible")
+        return permit
+
+    def post_json(self, url, payload, params=None, **kwargs):
+        """POST JSON → JSON décodé. Lève CircuitOpenError ou la dernière erreur rencontrée."""
+        permit = self._permit()
+        try:
+            return self._post_json(url, payload, params, **kwargs)
+        finally:
+            self.breaker.release(permit)
+
+    def _post_json(self, url, payload, params=None, **kwargs):
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+            start = time.perf_counter()
+            response = None
+            try:
+                response = self.session.post(url, params=params, json=payload, timeout=self.timeout, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    result = response.json()
+                    self.latency.observe(time.perf_counter() - start)
+                    self.breaker.record_success()
+                    return result
+                last_error = requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+            except Exception:
+                # Erreur non transitoire (4xx, JSON invalide...) : pas de nouvelle tentative
+                self.latency.observe(time.perf_counter() - start)
+                self.breaker.record_failure()
+                raise
+            self.latency.observe(time.perf_counter() - start)
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response))
+
+        self.breaker.record_failure()
+        raise last_error
+
+    def post_stream(self, url, payload, params=None):
+        """
+        POST JSON dont la réponse est un flux server-sent events : produit chaque
+        événement `data:` décodé. Pas de nouvelle tentative une fois le flux commencé.
+        """
+        permit = self._permit()
+        try:
+            start = time.perf_counter()
+            try:
+                response = self.session.post(url, params=params, json=payload, timeout=self.timeout, stream=True)
+                response.raise_for_status()
+            except Exception:
+                self.latency.observe(time.perf_counter() - start)
+                self.breaker.record_failure()
+                raise
+
+            try:
+                with response:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line and line.startswith("data:"):
+                            yield json.loads(line[len("data:"):])
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            finally:
+                self.latency.observe(time.perf_counter() - start)
+            self.breaker.record_success()
+        finally:
+            # GeneratorExit (client déconnecté) : ni succès ni échec, l'essai est libéré
+            self.breaker.release(permit)
+
+    def _async_runtime(self):
+        """
+        Boucle d'événements dédiée (un thread) et son httpx.AsyncClient, partagés par
+        tout le processus : les connexions keep-alive sont réutilisées quelle que soit
+        la boucle de l'appelant (Flask en crée une par requête asynchrone).
+        """
+        with self._async_lock:
+            if self._async is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="gemini-async", daemon=True).start()
+                connect_timeout, read_timeout = self.timeout
+                client = httpx.AsyncClient(
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                    limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+                )
+                self._async = (loop, client)
+                atexit.register(self.close_async)
+            return self._async
+
+    def close_async(self):
+        """Ferme le client asynchrone et arrête sa boucle (enregistré pour l'arrêt du processus)"""
+        with self._async_lock:
+            runtime, self._async = self._async, None
+        if runtime is None:
+            return
+        loop, client = runtime
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+
+    async def apost_json(self, url, payload, params=None):
+        """
+        Comme post_json (tentatives, backoff, disjoncteur, latence), exécuté sur la boucle
+        partagée : la boucle de l'appelant n'est pas bloquée, mais sous Flask (WSGI) le
+        thread de la requête attend quand même la réponse. Annuler l'appelant annule la requête.
+        """
+        loop, client = self._async_runtime()
+        future = asyncio.run_coroutine_threadsafe(self._apost_json(client, url, payload, params), loop)
+        return await asyncio.wrap_future(future)
+
+    async def _apost_json(self, client, url, payload, params):
+        permit = self._permit()
+        try:
+            last_error = None
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self.retries += 1
+                start = time.perf_counter()
+                response = None
+                try:
+                    response = await client.post(url, params=params, json=payload)
+                    if response.status_code not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        result = response.json()
+                        self.latency.observe(time.perf_counter() - start)
+                        self.breaker.record_success()
+                        return result
+                    last_error = httpx.HTTPStatusError(f"{response.status_code} {response.reason_phrase}",
+                                                       request=response.request, response=response)
+                except httpx.TransportError as e:
+                    last_error = e
+                except Exception:
+                    # Erreur non transitoire (4xx, JSON invalide...) : pas de nouvelle tentative
+                    self.latency.observe(time.perf_counter() - start)
+                    self.breaker.record_failure()
+                    raise
+                self.latency.observe(time.perf_counter() - start)
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self._backoff(attempt, response))
+
+            self.breaker.record_failure()
+            raise last_error
+        finally:
+            self.breaker.release(permit)
+
+    def stats(self):
+        return {
+            "breaker": self.breaker.state,
+            "retries": self.retries,
+            "short_circuited": self.short_circuited,
+            "latency": self.latency.snapshot(),
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Client partagé par tout le processus (un seul pool de connexions)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PooledHttpClient()
+    return _client
@@ -0,0 +1,407 @@
+# chatbot/knowledge_base.py
+import sys
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+from config.settings import MODEL_WATCH_INTERVAL, KB_REFRESH_INTERVAL, KB_COMPACT_INTERVAL, RETRIEVAL_MODE
+from database.mongo_client import iter_leads, leads_collection
+from models.registry import (
+    current_version, load_model, load_retrieval_vectorizer, model_exists, model_location, read_retrieval_manifest
+)
+from .dense_index import DenseIndex
+from .normalization import clean_text
+
+# Mots-clés du fallback de recherche (2e niveau de ResponseRetriever)
+FALLBACK_KEYWORDS = ("bourse", "bac", "master", "info", "anglais", "flywire", "visa", "engineering")
+
+
+@dataclass(frozen=True)
+class KnowledgeSnapshot:
+    """
+    Instantané immuable partagé par toutes les sessions du processus :
+    paires Q/R, vectoriseur, classifieur et matrice des questions précalculée
+    (CSR, lignes normalisées L2 : un produit matriciel donne directement le cosinus).
+    La matrice des questions est construite avec le vectoriseur de recherche dédié
+    s'il est publié, sinon avec celui du modèle de statut.
+    Les questions nettoyées et l'index inversé sont aussi calculés une seule fois.
+    """
+    conversations: tuple
+    cleaned_questions: tuple
+    token_index: dict
+    keyword_index: dict
+    vectorizer: object
+    model: object
+    model_version: object
+    retrieval_vectorizer: object  # n-grammes de caractères (models.retrieval_vectorizer) ou None
+    retrieval_version: object
+    question_vectors: object
+    dense_index: object  # DenseIndex (RETRIEVAL_MODE=dense) ou None
+    high_water_mark: object  # plus grand _id MongoDB déjà intégré
+    built_at: str
+    build_seconds: float
+
+    @property
+    def is_loaded(self):
+        return self.vectorizer is not None and self.model is not None
+
+    @property
+    def size_bytes(self):
+        """Taille des structures propres à l'instantané (textes, index, matrices), hors modèle partagé"""
+        size = sum(sys.getsizeof(item["question"]) + sys.getsizeof(item["answer"]) for item in self.conversations)
+        size += sum(sys.getsizeof(text) for text in self.cleaned_questions)
+        for index in (self.token_index, self.keyword_index):
+            size += sys.getsizeof(index) + sum(sys.getsizeof(key) + postings.nbytes for key, postings in index.items())
+        if self.question_vectors is not None:
+            vectors = self.question_vectors
+            size += vectors.data.nbytes + vectors.indices.nbytes + vectors.indptr.nbytes
+        if self.dense_index is not None:
+            size += self.dense_index.nbytes
+        return size
+
+    @property
+    def search_vectorizer(self):
+        """Vectoriseur des questions de la base et des requêtes de recherche"""
+        return self.retrieval_vectorizer if self.retrieval_vectorizer is not None else self.vectorizer
+
+    def stats(self):
+        return {
+            "pairs": len(self.conversations),
+            "model_loaded": self.is_loaded,
+            "model_version": self.model_version,
+            "retrieval_version": self.retrieval_version,
+            "retrieval": f"dense/{self.dense_index.backend}" if self.dense_index is not None else "sparse",
+            "built_at": self.built_at,
+            "build_seconds": round(self.build_seconds, 3),
+            "size_mb": round(self.size_bytes / (1024 * 1024), 2),
+        }
+
+
+def load_predictor():
+    """Retourne (vectoriseur, modèle, version) depuis le registre des modèles"""
+    try:
+        if not model_exists():
+            print(f"❌ Modèle non trouvé : {model_location()}")
+            return None, None, None
+        data, version = load_model()
+        print(f"✅ Modèle chargé depuis : {model_location()} (version {version})")
+        return data["vectorizer"], data["model"], version
+    except Exception as e:
+        print(f"❌ Erreur : {e}")
+        return None, None, None
+
+
+def load_search_vectorizer():
+    """Retourne (vectoriseur, version) de recherche publié, ou (None, None)"""
+    try:
+        vectorizer, version = load_retrieval_vectorizer()
+        if vectorizer is not None:
+            print(f"✅ Vectoriseur de recherche chargé (version {version})")
+        return vectorizer, version
+    except Exception as e:
+        print(f"❌ Vectoriseur de recherche illisible, repli sur celui du modèle : {e}")
+        return None, None
+
+
+def extract_pairs(conv):
+    """Paires Q/R d'une conversation : message contact suivi d'une réponse conseiller"""
+    pairs = []
+    messages = conv.get("messages", [])
+    for i, msg in enumerate(messages):
+        if (msg.get("sender_type") == "contact"
+                and i + 1 < len(messages)
+                and messages[i + 1].get("sender_type") == "user"):
+            question = msg["text"].strip()
+            answer = messages[i + 1]["text"].strip()
+            if question and answer:
+                pairs.append({
+                    "question": question,
+                    "answer": answer
+                })
+    return pairs
+
+
+def load_from_mongodb(since=None):
+    """
+    Retourne (paires Q/R, plus grand _id lu). `since` : ne lit que les documents
+    dont l'_id est strictement supérieur (ingestion incrémentale).
+    """
+    query = {"_id": {"$gt": since}} if since is not None else {}
+    try:
+        knowledge = []
+        high_water_mark = since
+        for conv in iter_leads(query, sort_by_id=True):
+            knowledge.extend(extract_pairs(conv))
+            high_water_mark = conv["_id"]
+        if since is None:
+            print(f"✅ {len(knowledge)} paires Q/R chargées")
+        return knowledge, high_water_mark
+    except Exception as e:
+        print(f"❌ Erreur MongoDB : {e}")
+        return [], since
+
+
+def build_token_index(cleaned_questions, offset=0):
+    """Index inversé : token → indices (croissants) des questions qui le contiennent"""
+    postings = {}
+    for idx, cleaned in enumerate(cleaned_questions, offset):
+        for token in set(cleaned.split()):
+            postings.setdefault(token, []).append(idx)
+    return {token: np.array(indices, dtype=np.intp) for token, indices in postings.items()}
+
+
+def build_keyword_index(token_index, keywords=FALLBACK_KEYWORDS):
+    """
+    Pour chaque mot-clé : indices des questions dont le texte nettoyé le contient
+    (sous-chaîne d'un token, comme l'ancien test `kw in clean_text(question)`).
+    """
+    keyword_index = {}
+    for kw in keywords:
+        matches = [indices for token, indices in token_index.items() if kw in token]
+        keyword_index[kw] = np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.intp)
+    return keyword_index
+
+
+def build_snapshot(conversations=None, high_water_mark=None):
+    """
+    Construit un nouvel instantané (scan MongoDB + chargement du modèle + vectorisation)
+    et mesure son temps de construction.
+    `conversations` / `high_water_mark` : paires Q/R déjà chargées à réutiliser
+    (évite un nouveau scan MongoDB).
+    """
+    start = time.perf_counter()
+
+    if conversations is None:
+        conversations, high_water_mark = load_from_mongodb()
+        conversations = tuple(conversations)
+    cleaned_questions = tuple(clean_text(item["question"]) for item in conversations)
+    token_index = build_token_index(cleaned_questions)
+    keyword_index = build_keyword_index(token_index)
+    vectorizer, model, model_version = load_predictor()
+    retrieval_vectorizer, retrieval_version = load_search_vectorizer()
+    search_vectorizer = retrieval_vectorizer if retrieval_vectorizer is not None else vectorizer
+    if search_vectorizer is not None and conversations:
+        question_vectors = normalize(search_vectorizer.transform(cleaned_questions).tocsr(), norm="l2", copy=False)
+    else:
+        question_vectors = None
+    dense_index = None
+    if RETRIEVAL_MODE == "dense" and question_vectors is not None and question_vectors.shape[0] > 1:
+        dense_index = DenseIndex.build(question_vectors)
+
+    build_seconds = time.perf_counter() - start
+
+    snapshot = KnowledgeSnapshot(
+        conversations=conversations,
+        cleaned_questions=cleaned_questions,
+        token_index=token_index,
+        keyword_index=keyword_index,
+        vectorizer=vectorizer,
+        model=model,
+        model_version=model_version,
+        retrieval_vectorizer=retrieval_vectorizer,
+        retrieval_version=retrieval_version,
+        question_vectors=question_vectors,
+        dense_index=dense_index,
+        high_water_mark=high_water_mark,
+        built_at=datetime.now().isoformat(timespec="seconds"),
+        build_seconds=build_seconds,
+    )
+    stats = snapshot.stats()
+    print(f"🧠 Base de connaissances prête : {stats['pairs']} paires, modèle {model_version}, "
+          f"{stats['build_seconds']}s, ~{stats['size_mb']} Mo")
+    return snapshot
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_knowledge_base():
+    """Retourne l'instantané du processus (construit une seule fois, au premier appel)"""
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = build_snapshot()
+    return _snapshot
+
+
+def reload_knowledge_base(rescan=False):
+    """
+    Reconstruit l'instantané avec le modèle publié (modèle + vectoriseur + matrice des
+    questions ensemble) et le remplace d'un coup. Les requêtes en cours gardent leur
+    référence vers l'ancien instantané et se terminent dessus.
+    """
+    global _snapshot
+    with _snapshot_lock:
+        if rescan or _snapshot is None:
+            new_snapshot = build_snapshot()
+        else:
+            new_snapshot = build_snapshot(_snapshot.conversations, _snapshot.high_water_mark)
+        if new_snapshot.is_loaded or _snapshot is None:
+            _snapshot = new_snapshot
+        else:
+            print("⚠️  Nouveau modèle illisible, l'instantané actuel est conservé")
+    return _snapshot
+
+
+def append_to_snapshot(snapshot, pairs, high_water_mark):
+    """
+    Nouvel instantané = ancien + nouvelles paires : seules les nouvelles questions
+    sont nettoyées, vectorisées et indexées, le reste est partagé avec l'ancien.
+    """
+    offset = len(snapshot.conversations)
+    new_cleaned = tuple(clean_text(item["question"]) for item in pairs)
+
+    new_tokens = build_token_index(new_cleaned, offset)
+    token_index = dict(snapshot.token_index)
+    for token, indices in new_tokens.items():
+        previous = token_index.get(token)
+        token_index[token] = indices if previous is None else np.concatenate([previous, indices])
+
+    keyword_index = dict(snapshot.keyword_index)
+    for kw, indices in build_keyword_index(new_tokens, FALLBACK_KEYWORDS).items():
+        keyword_index[kw] = np.concatenate([keyword_index[kw], indices])
+
+    question_vectors, dense_index = snapshot.question_vectors, snapshot.dense_index
+    if snapshot.search_vectorizer is not None:
+        new_vectors = normalize(snapshot.search_vectorizer.transform(new_cleaned).tocsr(), norm="l2", copy=False)
+        question_vectors = new_vectors if question_vectors is None else sp.vstack(
+            [question_vectors, new_vectors], format="csr")
+        # Projection LSA inchangée jusqu'à la prochaine compaction
+        if dense_index is not None:
+            dense_index = dense_index.extend(new_vectors)
+
+    return replace(
+        snapshot,
+        conversations=snapshot.conversations + tuple(pairs),
+        cleaned_questions=snapshot.cleaned_questions + new_cleaned,
+        token_index=token_index,
+        keyword_index=keyword_index,
+        question_vectors=question_vectors,
+        dense_index=dense_index,
+        high_water_mark=high_water_mark,
+    )
+
+
+def ingest_new_conversations():
+    """
+    Ajoute à l'instantané les conversations arrivées depuis le dernier _id intégré.
+    Retourne le nombre de paires Q/R ajoutées.
+    """
+    global _snapshot
+    snapshot = get_knowledge_base()
+    pairs, high_water_mark = load_from_mongodb(since=snapshot.high_water_mark)
+    if high_water_mark == snapshot.high_water_mark:
+        return 0
+    with _snapshot_lock:
+        # Un rechargement complet a pu passer entre-temps : on repart du courant
+        if _snapshot is not snapshot:
+            return 0
+        _snapshot = append_to_snapshot(snapshot, pairs, high_water_mark) if pairs else replace(
+            snapshot, high_water_mark=high_water_mark)
+    if pairs:
+        print(f"📥 {len(pairs)} nouvelles paires Q/R intégrées ({len(_snapshot.conversations)} au total)")
+    return len(pairs)
+
+
+class KnowledgeIngester(threading.Thread):
+    """
+    Maintient la base à jour en continu : ingestion incrémentale dès qu'un document
+    est inséré (change stream si MongoDB est en replica set, sinon interrogation
+    toutes les KB_REFRESH_INTERVAL secondes) et compaction périodique par
+    reconstruction complète (prend aussi en compte modifications et suppressions).
+    """
+
+    def __init__(self, interval=KB_REFRESH_INTERVAL, compact_interval=KB_COMPACT_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.compact_interval = compact_interval
+        self._stop_event = threading.Event()
+
+    def _open_change_stream(self):
+        try:
+            return leads_collection.watch(
+                [{"$match": {"operationType": "insert"}}],
+                max_await_time_ms=int(self.interval * 1000)
+            )
+        except Exception:
+            return None  # Pas de replica set : interrogation périodique
+
+    def run(self):
+        stream = self._open_change_stream()
+        mode = "change stream" if stream is not None else f"interrogation toutes les {self.interval}s"
+        print(f"📡 Ingestion incrémentale de la base lancée ({mode})")
+        last_compaction = time.monotonic()
+
+        while not self._stop_event.is_set():
+            try:
+                inserted = True
+                if stream is not None:
+                    # Bloque au plus `interval` secondes en attendant une insertion
+                    inserted = stream.try_next() is not None
+                elif self._stop_event.wait(self.interval):
+                    break
+
+                # Compaction vérifiée à chaque tour, même sans insertion (collection calme)
+                if time.monotonic() - last_compaction >= self.compact_interval:
+                    print("🧹 Compaction de la base de connaissances...")
+                    reload_knowledge_base(rescan=True)
+                    last_compaction = time.monotonic()
+                elif inserted:
+                    ingest_new_conversations()
+            except Exception as e:
+                print(f"❌ Erreur d'ingestion : {e}")
+                stream = None
+                self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_ingester():
+    ingester = KnowledgeIngester()
+    ingester.start()
+    return ingester
+
+
+class ModelWatcher(threading.Thread):
+    """
+    Surveille les manifestes du modèle et du vectoriseur de recherche et recharge
+    l'instantané à chaque nouvelle version de l'un ou de l'autre
+    """
+
+    def __init__(self, interval=MODEL_WATCH_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                snapshot = get_knowledge_base()
+                version = current_version()
+                retrieval = read_retrieval_manifest()
+                if version and version != snapshot.model_version:
+                    print(f"🔄 Nouveau modèle détecté ({version}), rechargement...")
+                    reload_knowledge_base()
+                elif retrieval and retrieval["version"] != snapshot.retrieval_version:
+                    print(f"🔄 Nouveau vectoriseur de recherche ({retrieval['version']}), rechargement...")
+                    reload_knowledge_base()
+            except Exception as e:
+                print(f"❌ Erreur du surveillant de modèle : {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_model_watcher():
+    watcher = ModelWatcher()
+    watcher.start()
+    print(f"👀 Surveillance du modèle lancée (toutes les {watcher.interval}s)")
+    return watcher
@@ -0,0 +1,82 @@
+# chatbot/normalization.py
+import re
+
+# Normalisation dialectale — forme historique : un re.sub par motif, appliqués
+# dans l'ordre du dict. Gardée comme référence (scripts/bench_clean_text.py
+# vérifie que DialectNormalizer produit exactement la même sortie).
+NORMALIZATION_MAP = {
+    r'\b3andi\b': '3andi', r'\bma3andich\b': 'ma3andich', r'\bma3andi\b': 'ma3andich',
+    r'\b3andek\b': '3andek', r'\bma3andek\b': 'ma3andek',
+    r'\b3andi bac\b': 'bac', r'\bkhdhitou\b': 'bac', r'\bfinich\b': 'bac',
+    r'\bboursa\b': 'bourse', r'\bboursat\b': 'bourse',
+    r'\bmastere\b': 'master', r'\bmaster\b': 'master',
+    r'\binformatique\b': 'info', r'\bcomputer science\b': 'info',
+    r'\b9dim\b': '9dim', r'\ble 9dim\b': '9dim',
+    r'\ble 3andi\b': '3andi', r'\ble ma3andich\b': 'ma3andich',
+    r'\bey\b': 'oui', r'\beyy\b': 'oui', r'\bna3am\b': 'oui',
+    r'\bla\b': 'non', r'\blem\b': 'non', r'\bma\b': 'non',
+    r'\bbch\b': 'bch', r'\bnheb\b': 'nheb', r'\bn7eb\b': 'nheb',
+    r'\b3ala9a\b': '3ala9a', r'\bw9fou\b': '3ala9a',
+    r'\benglish\b': 'anglais', r'\bielts\b': 'anglais', r'\btoefl\b': 'anglais',
+    r'\bvisa\b': 'visa', r'\bflywire\b': 'flywire'
+}
+
+# Même normalisation, en une seule passe : expression → remplacement.
+# Les entrées identité (3andi → 3andi, ...) sont inutiles et omises.
+# Les expressions multi-mots passent avant les mots simples (plus long d'abord) ;
+# deux entrées composées reproduisent l'enchaînement des re.sub historiques :
+#   - "le 3andi bac" : "3andi bac" → "bac" était appliqué avant "le 3andi"
+#   - "le ma3andi"   : "ma3andi" → "ma3andich" puis "le ma3andich" → "ma3andich"
+DIALECT_PHRASES = {
+    # Multi-mots
+    "le 3andi bac": "le bac",
+    "le ma3andich": "ma3andich", "le ma3andi": "ma3andich",
+    "3andi bac": "bac", "computer science": "info",
+    "le 9dim": "9dim", "le 3andi": "3andi",
+    # Mots simples
+    "ma3andi": "ma3andich",
+    "khdhitou": "bac", "finich": "bac",
+    "boursa": "bourse", "boursat": "bourse",
+    "mastere": "master", "informatique": "info",
+    "ey": "oui", "eyy": "oui", "na3am": "oui",
+    "la": "non", "lem": "non", "ma": "non",
+    "n7eb": "nheb", "w9fou": "3ala9a",
+    "english": "anglais", "ielts": "anglais", "toefl": "anglais",
+}
+
+
+class DialectNormalizer:
+    """
+    Normaliseur compilé : une seule regex d'alternance pour le dialecte
+    (remplacement via callback) et une seule passe pour ponctuation + espaces.
+    """
+
+    def __init__(self, phrases=DIALECT_PHRASES):
+        self.phrases = dict(phrases)
+        # Plus de mots d'abord, puis plus long : à position égale, l'expression
+        # la plus longue gagne (ex. "le 3andi bac" avant "le 3andi")
+        ordered = sorted(self.phrases, key=lambda p: (-len(p.split()), -len(p), p))
+        self._dialect = re.compile(r"\b(?:" + "|".join(map(re.escape, ordered)) + r")\b")
+        # Suite de ponctuation/espaces → " " si elle contient un espace, sinon supprimée
+        # (équivaut à supprimer [^\w\s] puis réduire \s+)
+        self._separators = re.compile(r"(?:[^\w\s]|\s)+")
+
+    def _replace_phrase(self, match):
+        return self.phrases[match.group(0)]
+
+    @staticmethod
+    def _replace_separator(match):
+        return " " if any(ch.isspace() for ch in match.group(0)) else ""
+
+    def __call__(self, text):
+        if not isinstance(text, str):
+            return ""
+        text = self._dialect.sub(self._replace_phrase, text.lower())
+        return self._separators.sub(self._replace_separator, text).strip()
+
+
+_normalizer = DialectNormalizer()
+
+
+def clean_text(text):
+    return _normalizer(text)
@@ -0,0 +1,136 @@
+# chatbot/prefetcher.py
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import PREFETCH_ENABLED, PREFETCH_MAX_IN_FLIGHT, SESSION_IDLE_TTL
+
+
+class Prefetcher:
+    """
+    Générations lancées en arrière-plan pendant que le client écrit (reformulation
+    de la prochaine question), rattachées à une session : session → {texte: future}.
+    Le nombre de générations en cours est borné pour tout le processus (un thread
+    chacune : une génération en file d'attente arriverait plus tard qu'un appel
+    direct) ; au-delà, les nouvelles demandes sont refusées (génération en direct).
+    Une session abandonnée (discard, ou inactive depuis `idle_ttl`) voit ses
+    générations annulées si elles n'ont pas commencé.
+    """
+
+    def __init__(self, max_in_flight=PREFETCH_MAX_IN_FLIGHT, idle_ttl=SESSION_IDLE_TTL):
+        self.max_in_flight = max_in_flight
+        self.idle_ttl = idle_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="prefetch")
+        self._slots = OrderedDict()  # session → (dernier accès, {texte: future}), du plus ancien au plus récent
+        self._in_flight = 0
+        self._lock = threading.RLock()  # future.cancel() appelle _done dans le thread qui tient déjà le verrou
+
+        self.submitted = 0
+        self.rejected = 0  # limite de générations en cours atteinte
+        self.hits = 0  # résultat utilisé (déjà prêt ou encore en cours)
+        self.waited = 0  # dont : encore en cours au moment de la réponse
+        self.failed = 0  # génération en erreur : refaite en direct
+        self.wasted = 0  # générée mais jamais utilisée
+        self.cancelled = 0  # annulée avant d'avoir commencé (aucun appel payé)
+
+    def _purge_expired(self, now):
+        while self._slots:
+            session, (last_seen, _) = next(iter(self._slots.items()))
+            if now - last_seen < self.idle_ttl:
+                break
+            self._drop(session)
+
+    def _drop(self, session):
+        _, futures = self._slots.pop(session)
+        for future in futures.values():
+            if future.cancel():
+                self.cancelled += 1
+            else:
+                self.wasted += 1
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            if not future.cancelled() and future.exception() is not None:
+                self.failed += 1
+
+    def submit(self, session, text, fn):
+        """Lance fn() en arrière-plan pour (session, texte) ; False si refusé ou déjà lancé"""
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            _, futures = self._slots.pop(session, (now, {}))
+            self._slots[session] = (now, futures)
+            if text in futures:
+                return False
+            if self._in_flight >= self.max_in_flight:
+                self.rejected += 1
+                return False
+            self._in_flight += 1
+            self.submitted += 1
+            future = self._executor.submit(fn)
+            futures[text] = future
+        future.add_done_callback(self._done)
+        return True
+
+    def take(self, session, text):
+        """
+        Future préchargée pour (session, texte), retirée de la session, ou None si
+        absente, en échec ou pas encore démarrée (annulée : l'appel direct sera plus
+        rapide). Encore en cours : l'appelant attend son résultat plutôt que de
+        relancer la même génération.
+        """
+        with self._lock:
+            entry = self._slots.get(session)
+            future = entry[1].pop(text, None) if entry else None
+            if future is None:
+                return None
+            if future.cancel():
+                self.cancelled += 1
+                return None
+            if future.done() and (future.cancelled() or future.exception() is not None):
+                return None
+            self.hits += 1
+            if not future.done():
+                self.waited += 1
+            return future
+
+    def discard(self, session):
+        """Session abandonnée ou questionnaire terminé : annule ce qui n'a pas servi"""
+        with self._lock:
+            if session in self._slots:
+                self._drop(session)
+
+    def stats(self):
+        with self._lock:
+            submitted = self.submitted
+            return {
+                "in_flight": self._in_flight,
+                "sessions": len(self._slots),
+                "submitted": submitted,
+                "rejected": self.rejected,
+                "hits": self.hits,
+                "waited": self.waited,
+                "failed": self.failed,
+                "wasted": self.wasted,
+                "cancelled": self.cancelled,
+                "hit_rate": round(self.hits / submitted, 3) if submitted else 0.0,
+                "waste_rate": round((self.wasted + self.cancelled) / submitted, 3) if submitted else 0.0,
+            }
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher():
+    """Préchargeur partagé par tout le processus (None si PREFETCH_ENABLED est désactivé)"""
+    global _prefetcher
+    if not PREFETCH_ENABLED:
+        return None
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = Prefetcher()
+    return _prefetcher
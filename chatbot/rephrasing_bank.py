@@ -0,0 +1,69 @@
+# chatbot/rephrasing_bank.py
+import hashlib
+import json
+import random
+import threading
+from pathlib import Path
+
+from config.settings import REPHRASING_BANK_PATH
+
+# Version du format de la banque (à incrémenter si la structure change)
+BANK_VERSION = 1
+QUESTIONS_PATH = Path(__file__).parent / "questions.json"
+
+
+def questions_hash(questions_file=QUESTIONS_PATH):
+    """Empreinte de questions.json : la banque est périmée dès que le fichier change"""
+    with open(questions_file, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class RephrasingBank:
+    """
+    Reformulations pré-générées (scripts/build_rephrasing_bank.py) des questions
+    de qualification et des messages finaux : texte original → [variantes].
+    """
+
+    def __init__(self, path=REPHRASING_BANK_PATH, questions_file=QUESTIONS_PATH):
+        self.path = Path(path)
+        self.texts = {}
+        self.status = "missing"
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != BANK_VERSION:
+                self.status = "unsupported_version"
+            elif data.get("questions_hash") != questions_hash(questions_file):
+                self.status = "stale"
+            else:
+                self.texts = data.get("texts", {})
+                self.status = "ready"
+        except Exception as e:
+            print(f"❌ Erreur de chargement de la banque de reformulations : {e}")
+            self.status = "invalid"
+
+    @property
+    def is_ready(self):
+        return self.status == "ready"
+
+    def get(self, text):
+        """Une variante au hasard, ou None si le texte n'est pas dans la banque"""
+        variants = self.texts.get(text)
+        return random.choice(variants) if variants else None
+
+
+_bank = None
+_bank_lock = threading.Lock()
+
+
+def get_rephrasing_bank():
+    global _bank
+    if _bank is None:
+        with _bank_lock:
+            if _bank is None:
+                _bank = RephrasingBank()
+                if not _bank.is_ready:
+                    print(f"⚠️  Banque de reformulations indisponible ({_bank.status}) → génération en direct")
+    return _bank
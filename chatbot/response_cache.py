@@ -0,0 +1,132 @@
+# chatbot/response_cache.py
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config.settings import (
+    GEMINI_CACHE_SIZE, GEMINI_CACHE_TTL, GEMINI_CACHE_VARIANTS, GEMINI_CACHE_DB, GEMINI_CACHE_DB_MAX_ROWS
+)
+
+# Nettoyage du niveau SQLite (lignes expirées + plafond) tous les N put()
+DB_PURGE_EVERY = 100
+
+
+def normalize_prompt(prompt):
+    """Deux prompts qui ne diffèrent que par la casse ou les espaces partagent la même entrée"""
+    return " ".join(prompt.split()).lower()
+
+
+class ResponseCache:
+    """
+    Cache des réponses Gemini : LRU en mémoire avec TTL, plus un niveau SQLite
+    optionnel partagé entre workers. Chaque clé garde jusqu'à `variants` réponses
+    différentes : tant que la clé n'en a pas assez, get() renvoie un miss pour
+    qu'une nouvelle formulation soit générée, ensuite une variante est tirée au hasard.
+    (Une clé dont les générations reviennent identiques cesse de provoquer des miss
+    après `variants` tentatives.) Le fichier SQLite est purgé des lignes expirées
+    et borné à `db_max_rows` lignes.
+    """
+
+    def __init__(self, max_entries=GEMINI_CACHE_SIZE, ttl=GEMINI_CACHE_TTL,
+                 variants=GEMINI_CACHE_VARIANTS, db_path=GEMINI_CACHE_DB, db_max_rows=GEMINI_CACHE_DB_MAX_ROWS):
+        self.max_entries = max_entries
+        self.db_max_rows = db_max_rows
+        self.db_purged = 0
+        self._puts = 0
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # clé → (date de création, [variantes], tentatives)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS gemini_cache ("
+                " key TEXT NOT NULL, response TEXT NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (key, response))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS gemini_cache_created ON gemini_cache (created)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(prompt, generation_config):
+        payload = json.dumps([normalize_prompt(prompt), generation_config], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load_from_db(self, key, now):
+        rows = self._db.execute(
+            "SELECT response, created FROM gemini_cache WHERE key = ? AND created > ? ORDER BY created",
+            (key, now - self.ttl)
+        ).fetchall()
+        if not rows:
+            return None
+        responses = [response for response, _ in rows][:self.variants]
+        return rows[0][1], responses, len(responses)
+
+    def _purge_db(self, now):
+        """Supprime les lignes expirées puis les plus anciennes au-delà de db_max_rows"""
+        purged = self._db.execute("DELETE FROM gemini_cache WHERE created <= ?", (now - self.ttl,)).rowcount
+        excess = self._db.execute("SELECT COUNT(*) FROM gemini_cache").fetchone()[0] - self.db_max_rows
+        if excess > 0:
+            purged += self._db.execute(
+                "DELETE FROM gemini_cache WHERE rowid IN"
+                " (SELECT rowid FROM gemini_cache ORDER BY created LIMIT ?)", (excess,)
+            ).rowcount
+        self.db_purged += purged
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] >= self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None and self._db is not None:
+                entry = self._load_from_db(key, now)
+                if entry is not None:
+                    self._entries[key] = entry
+            if entry is None or entry[2] < self.variants:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return random.choice(entry[1])
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock:
+            created, responses, attempts = self._entries.pop(key, (now, [], 0))
+            if response not in responses and len(responses) < self.variants:
+                responses.append(response)
+            self._entries[key] = (created, responses, attempts + 1)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO gemini_cache (key, response, created) VALUES (?, ?, ?)",
+                    (key, response, created)
+                )
+                self._puts += 1
+                if self._puts % DB_PURGE_EVERY == 0:
+                    self._purge_db(now)
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "variants_per_key": self.variants,
+                "sqlite": self._db is not None,
+                "sqlite_purged": self.db_purged,
+            }
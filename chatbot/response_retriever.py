@@ -1,160 +1,270 @@
 # chatbot/response_retriever.py
-import joblib
+import threading
+import time
 import numpy as np
-from pathlib import Path
-from .gemini_assistant import GeminiAssistant
-from database.mongo_client import leads_collection
-import re
-
-# Chemin du modèle
-PROJECT_ROOT = Path(__file__).parent.parent
-MODEL_PATH = PROJECT_ROOT / "models" / "saved" / "status_predictor.pkl"
-
-# Normalisation dialectale
-NORMALIZATION_MAP = {
-    r'\b3andi\b': '3andi', r'\bma3andich\b': 'ma3andich', r'\bma3andi\b': 'ma3andich',
-    r'\b3andek\b': '3andek', r'\bma3andek\b': 'ma3andek',
-    r'\b3andi bac\b': 'bac', r'\bkhdhitou\b': 'bac', r'\bfinich\b': 'bac',
-    r'\bboursa\b': 'bourse', r'\bboursat\b': 'bourse',
-    r'\bmastere\b': 'master', r'\bmaster\b': 'master',
-    r'\binformatique\b': 'info', r'\bcomputer science\b': 'info',
-    r'\b9dim\b': '9dim', r'\ble 9dim\b': '9dim',
-    r'\ble 3andi\b': '3andi', r'\ble ma3andich\b': 'ma3andich',
-    r'\bey\b': 'oui', r'\beyy\b': 'oui', r'\bna3am\b': 'oui',
-    r'\bla\b': 'non', r'\lem\b': 'non', r'\bma\b': 'non',
-    r'\bbch\b': 'bch', r'\bnheb\b': 'nheb', r'\bn7eb\b': 'nheb',
-    r'\b3ala9a\b': '3ala9a', r'\bw9fou\b': '3ala9a',
-    r'\benglish\b': 'anglais', r'\bielts\b': 'anglais', r'\btoefl\b': 'anglais',
-    r'\bvisa\b': 'visa', r'\bflywire\b': 'flywire'
-}
-
-
-def clean_text(text):
-    if not isinstance(text, str):
-        return ""
-    text = text.lower()
-    for pattern, replacement in NORMALIZATION_MAP.items():
-        text = re.sub(pattern, replacement, text)
-    text = re.sub(r"[^\w\s]", "", text)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+from sklearn.preprocessing import normalize
+from config.settings import DENSE_SIMILARITY_THRESHOLD, RETRIEVAL_SIMILARITY_THRESHOLD, RAG_TOP_K, RAG_MAX_CHARS
+from .gemini_assistant import FALLBACK_TEXT, GeminiAssistant
+from .dense_index import top_k
+from .http_client import LatencyHistogram
+from .knowledge_base import FALLBACK_KEYWORDS, get_knowledge_base
+from .normalization import clean_text
+
+# Seuil de similarité cosinus pour accepter une réponse de la base
+SIMILARITY_THRESHOLD = 0.25
+# Nombre de candidats retournés par défaut
+TOP_K = 5
+# Réponse demandée à Gemini quand aucune paire fournie n'est pertinente
+NO_ANSWER_TEXT = "On va te répondre bientôt, merci pour ta patience !"
+# Instructions du fallback (remplacent celles de l'assistant : pas de règles imbriquées)
+FALLBACK_INSTRUCTION = f"""Tu es un conseiller académique pour des études en Malaisie.
+Trouve la meilleure réponse à la question d'un client parmi les réponses de la base fournies.
+
+Règles :
+1. Ne réponds qu'avec une réponse de la base
+2. Reformule-la en tunisien latin naturel
+3. Si aucune pertinente, dis : "{NO_ANSWER_TEXT}\""""
+
+
+class FallbackStats:
+    """Compteurs du 3e niveau (Gemini) : appels, réponses trouvées, taille des prompts, latence"""
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.skipped = 0  # aucun candidat pertinent : Gemini n'est pas appelé
+        self.prompt_chars = 0
+        self.pairs = 0
+        self.latency = LatencyHistogram()
+        self._lock = threading.Lock()
+
+    def record(self, pairs, prompt_chars, seconds, hit):
+        with self._lock:
+            self.calls += 1
+            self.hits += int(hit)
+            self.pairs += pairs
+            self.prompt_chars += prompt_chars
+        self.latency.observe(seconds)
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def stats(self):
+        with self._lock:
+            calls = self.calls
+            return {
+                "calls": calls,
+                "skipped": self.skipped,
+                "hit_rate": round(self.hits / calls, 4) if calls else 0.0,
+                "avg_prompt_chars": round(self.prompt_chars / calls) if calls else 0,
+                "avg_pairs": round(self.pairs / calls, 2) if calls else 0.0,
+                "latency": self.latency.snapshot(),
+            }
 
 
 class ResponseRetriever:
-    def __init__(self, gemini_assistant=None):
+    def __init__(self, gemini_assistant=None, snapshot=None):
         self.gemini = gemini_assistant or GeminiAssistant()
-        self.conversations = self.load_from_mongodb()
-        self.vectorizer, self.prediction_model = self.load_predictor()
+        self._snapshot = snapshot
+        self.fallback_stats = FallbackStats()
+
+    # 📚 Les données viennent de l'instantané partagé (aucune copie par session)
+    @property
+    def snapshot(self):
+        return self._snapshot or get_knowledge_base()
+
+    @property
+    def conversations(self):
+        return self.snapshot.conversations
+
+    @property
+    def vectorizer(self):
+        return self.snapshot.vectorizer
+
+    @property
+    def prediction_model(self):
+        return self.snapshot.model
+
+    @property
+    def question_vectors(self):
+        return self.snapshot.question_vectors
 
-        if self.vectorizer and self.conversations:
-            self.question_vectors = self._precompute_vectors()
-        else:
-            self.question_vectors = []
+    @staticmethod
+    def similarity_threshold(snapshot):
+        """Seuil d'acceptation selon l'espace de recherche de l'instantané"""
+        if snapshot.dense_index is not None:
+            return DENSE_SIMILARITY_THRESHOLD
+        if snapshot.retrieval_vectorizer is not None:
+            return RETRIEVAL_SIMILARITY_THRESHOLD
+        return SIMILARITY_THRESHOLD
 
-    def load_predictor(self):
+    def _query_vectors(self, snapshot, cleaned_queries):
+        """Vecteurs TF-IDF normalisés des requêtes et masque des requêtes sans terme connu"""
+        query_vecs = normalize(snapshot.search_vectorizer.transform(cleaned_queries).tocsr(), norm="l2", copy=False)
+        return query_vecs, np.diff(query_vecs.indptr) == 0
+
+    def _score(self, snapshot, cleaned_queries):
+        """
+        Cosinus entre chaque requête et toutes les questions de la base :
+        un seul produit matrice creuse × matrice creuse (lignes déjà normalisées L2).
+        Retourne (scores denses nb_requêtes × nb_questions, masque des requêtes vides),
+        ou (None, None) en cas d'erreur.
+        """
         try:
-            if not MODEL_PATH.exists():
-                print(f"❌ Modèle non trouvé : {MODEL_PATH}")
-                return None, None
-            data = joblib.load(MODEL_PATH)
-            print(f"✅ Modèle chargé depuis : {MODEL_PATH}")
-            return data["vectorizer"], data["model"]
-        except Exception as e:
-            print(f"❌ Erreur : {e}")
+            query_vecs, empty = self._query_vectors(snapshot, cleaned_queries)
+        except:
             return None, None
+        return (query_vecs @ snapshot.question_vectors.T).toarray(), empty
+
+    def _rank(self, snapshot, cleaned_queries, k):
+        """
+        Pour chaque requête : (indices des k questions les plus proches, leurs scores,
+        fonction indices → scores), ou None si la requête n'a aucun terme connu.
+        Mode dense (instantané avec index LSA) : plus proches voisins approchés,
+        scores = cosinus LSA ; sinon cosinus TF-IDF sur toute la base.
+        Retourne None en cas d'erreur.
+        """
+        dense_index = snapshot.dense_index
+        if dense_index is None:
+            scores, empty = self._score(snapshot, cleaned_queries)
+            if scores is None:
+                return None
+            ranked = []
+            for row, is_empty in zip(scores, empty):
+                top = top_k(row, k)
+                ranked.append(None if is_empty else (top, row[top], lambda indices, row=row: row[indices]))
+            return ranked
 
-    def load_from_mongodb(self):
         try:
-            db_conversations = list(leads_collection.find({}))
-            knowledge = []
-            for conv in db_conversations:
-                messages = conv.get("messages", [])
-                for i, msg in enumerate(messages):
-                    if (msg.get("sender_type") == "contact"
-                            and i + 1 < len(messages)
-                            and messages[i + 1].get("sender_type") == "user"):
-                        question = msg["text"].strip()
-                        answer = messages[i + 1]["text"].strip()
-                        if question and answer:
-                            knowledge.append({
-                                "question": question,
-                                "answer": answer
-                            })
-            print(f"✅ {len(knowledge)} paires Q/R chargées")
-            return knowledge
-        except Exception as e:
-            print(f"❌ Erreur MongoDB : {e}")
-            return []
+            query_vecs, empty = self._query_vectors(snapshot, cleaned_queries)
+            embeddings = dense_index.encode(query_vecs)
+        except:
+            return None
+        return [
+            None if is_empty else (indices, scores, lambda indices, query=query: dense_index.similarities(query, indices))
+            for (indices, scores), query, is_empty in zip(dense_index.search(embeddings, k), embeddings, empty)
+        ]
 
-    def _precompute_vectors(self):
-        if not self.vectorizer or not self.conversations:
+    def find_candidates(self, user_message, k=TOP_K):
+        """
+        Retourne les k meilleures paires Q/R pour un message : [(paire, score), ...]
+        """
+        snapshot = self.snapshot
+        if not snapshot.conversations or snapshot.search_vectorizer is None:
             return []
-        questions = [clean_text(item["question"]) for item in self.conversations]
-        return self.vectorizer.transform(questions)
+        cleaned_query = clean_text(user_message)
+        if not cleaned_query:
+            return []
+        ranked = self._rank(snapshot, [cleaned_query], k)
+        if not ranked or ranked[0] is None:
+            return []
+        indices, scores, _ = ranked[0]
+        if not len(indices) or scores[0] <= 0:
+            return []
+        return [(snapshot.conversations[idx], float(score)) for idx, score in zip(indices, scores)]
 
-    def find_response(self, user_message):
+    def find_response(self, user_message, context=""):
         """
-        Trouve la meilleure réponse avec plusieurs niveaux de fallback
+        Trouve la meilleure réponse avec plusieurs niveaux de fallback.
+        `context` : contexte de la conversation, transmis au seul fallback Gemini.
         """
-        if not self.conversations or not self.vectorizer:
-            return None
+        return self.find_responses([user_message], [context])[0]
 
-        cleaned_query = clean_text(user_message)
-        if not cleaned_query:
+    def find_responses(self, user_messages, contexts=None):
+        """
+        Version groupée de find_response : tous les messages sont vectorisés
+        et scorés en un seul produit matriciel.
+        """
+        snapshot = self.snapshot
+        if not snapshot.conversations or snapshot.search_vectorizer is None:
+            return [None] * len(user_messages)
+
+        cleaned_queries = [clean_text(message) for message in user_messages]
+        to_score = [i for i, cleaned in enumerate(cleaned_queries) if cleaned]
+        results = [None] * len(user_messages)
+        if not to_score:
+            return results
+
+        # 🔍 1. Recherche TF-IDF (ou LSA dense) : les k meilleurs servent aussi au fallback Gemini
+        ranked = self._rank(snapshot, [cleaned_queries[i] for i in to_score], RAG_TOP_K)
+        if ranked is None:
+            return results
+
+        for entry, i in zip(ranked, to_score):
+            # Requête sans aucun terme connu du vectoriseur
+            if entry is None or not len(entry[0]):
+                continue
+            indices, scores, similarity = entry
+            results[i] = self._resolve(snapshot, user_messages[i], cleaned_queries[i],
+                                       indices, scores, similarity, contexts[i] if contexts else "")
+        return results
+
+    @staticmethod
+    def build_fallback_context(pairs, max_chars=RAG_MAX_CHARS):
+        """
+        Bloc Q/R du prompt de fallback : paires dans l'ordre de similarité, une seule
+        par réponse (texte nettoyé), jusqu'à `max_chars` caractères. La première paire
+        est tronquée si elle dépasse à elle seule le budget.
+        Retourne (bloc, nombre de paires gardées).
+        """
+        blocks, seen, size = [], set(), 0
+        for item in pairs:
+            key = clean_text(item["answer"])
+            if key in seen:
+                continue
+            block = f"Q: {item['question']}\nR: {item['answer']}\n---"
+            if size + len(block) + 1 > max_chars:
+                if blocks:
+                    break
+                block = block[:max_chars]
+            seen.add(key)
+            blocks.append(block)
+            size += len(block) + 1
+        return "\n".join(blocks), len(blocks)
+
+    def _ask_gemini(self, user_message, pairs, context=""):
+        """🚨 3. Fallback : Gemini choisit parmi les paires les plus proches du message"""
+        kb_sample, kept = self.build_fallback_context(pairs)
+        if not kept:
+            # Aucune paire liée à la question : inutile de payer un appel
+            self.fallback_stats.record_skip()
+            print(f"🤖 Fallback Gemini ignoré : aucun candidat pour {user_message[:40]!r}")
             return None
 
-        # 🔍 1. Recherche TF-IDF
+        prompt = f"Réponses de la base :\n{kb_sample}\n\nQuestion du client : \"{user_message}\""
+        start = time.perf_counter()
         try:
-            query_vec = self.vectorizer.transform([cleaned_query])
-            query_norm = np.linalg.norm(query_vec.toarray()[0])
-            if query_norm == 0:
-                return None
+            response = self.gemini.generate_response(prompt, context=context, instruction=FALLBACK_INSTRUCTION)
         except:
-            return None
+            response = None
+        elapsed = time.perf_counter() - start
 
-        best_score = -1
-        best_idx = -1
-        query_array = query_vec.toarray()[0]
+        hit = bool(response) and response != FALLBACK_TEXT and clean_text(NO_ANSWER_TEXT) not in clean_text(response)
+        self.fallback_stats.record(kept, len(prompt), elapsed, hit)
+        print(f"🤖 Fallback Gemini : {kept} paires, {len(prompt)} caractères (~{len(prompt) // 4} tokens), "
+              f"{elapsed * 1000:.0f} ms, {'réponse trouvée' if hit else 'aucune réponse'}")
+        # Sans réponse : None, l'appelant affiche son message d'attente sans reformulation
+        return response if hit else None
 
-        for idx, item_vec in enumerate(self.question_vectors):
-            item_array = item_vec.toarray()[0]
-            item_norm = np.linalg.norm(item_array)
-            if item_norm == 0:
-                continue
-            cosine_sim = np.dot(query_array, item_array) / (query_norm * item_norm)
-            if cosine_sim > best_score:
-                best_score = cosine_sim
-                best_idx = idx
+    def _resolve(self, snapshot, user_message, cleaned_query, indices, scores, similarity, context=""):
+        conversations = snapshot.conversations
+        threshold = self.similarity_threshold(snapshot)
+        best_idx, best_score = indices[0], scores[0]
 
         # ✅ Bonne similarité → retourne la réponse
-        if best_score >= 0.25:
-            return self.conversations[best_idx]["answer"]
+        if best_score >= threshold:
+            return conversations[best_idx]["answer"]
 
-        # 🔁 2. Fallback : Recherche par mots-clés simples
-        keywords = ["bourse", "bac", "master", "info", "anglais", "flywire", "visa", "engineering"]
-        for kw in keywords:
+        # 🔁 2. Fallback : Recherche par mots-clés (index inversé précalculé)
+        #    Parmi les questions contenant le mot-clé, on garde la plus similaire
+        #    (égalité → la première de la base).
+        for kw in FALLBACK_KEYWORDS:
             if kw in cleaned_query:
-                for item in self.conversations:
-                    if kw in clean_text(item["question"]):
-                        return item["answer"]
-
-        # 🚨 3. Fallback : Gemini cherche sémantiquement
-        kb_sample = "\n".join([
-            f"Q: {item['question']}\nR: {item['answer']}\n---"
-            for item in self.conversations[:20]
-        ])
-        prompt = f"""
-        Trouve la meilleure réponse parmi celles-ci :
-        {kb_sample}
-
-        Question du client : "{user_message}"
-
-        Règles :
-        1. Ne réponds qu'avec une réponse de la base
-        2. Reformule-la en tunisien latin naturel
-        3. Si aucune pertinente, dis : "On va te répondre bientôt, merci pour ta patience !"
-        """
-        try:
-            return self.gemini.generate_response(prompt)
-        except:
-            return None
\ No newline at end of file
+                postings = snapshot.keyword_index.get(kw)
+                if postings is not None and len(postings):
+                    return conversations[postings[np.argmax(similarity(postings))]]["answer"]
+
+        # 🚨 3. Fallback : Gemini, avec les seuls candidats qui ont un terme en commun
+        return self._ask_gemini(user_message, [conversations[idx] for idx, score in zip(indices, scores) if score > 0],
+                                context)
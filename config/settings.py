@@ -9,9 +9,87 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = "chatbot_db"
 COLLECTION_NAME = "leads"
+MONGO_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", 500))    # documents par lot de curseur
+MONGO_READ_WORKERS = int(os.getenv("MONGO_READ_WORKERS", 1))  # curseurs parallèles (intervalles d'_id)
 
 # Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_API_URL = os.getenv(
+    "GEMINI_API_URL",
+    "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+)
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", 3.05))
+GEMINI_READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", 20))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 2))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", 0.5))  # secondes
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", 4))
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", 20))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", 5))  # échecs consécutifs
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", 30))  # secondes avant un essai
+GEMINI_CACHE_ENABLED = os.getenv("GEMINI_CACHE_ENABLED", "1") == "1"
+GEMINI_CACHE_SIZE = int(os.getenv("GEMINI_CACHE_SIZE", 2000))
+GEMINI_CACHE_TTL = int(os.getenv("GEMINI_CACHE_TTL", 24 * 3600))  # secondes
+GEMINI_CACHE_VARIANTS = int(os.getenv("GEMINI_CACHE_VARIANTS", 3))  # formulations gardées par prompt
+GEMINI_CACHE_DB = os.getenv("GEMINI_CACHE_DB", "")  # chemin SQLite partagé entre workers (optionnel)
+GEMINI_CACHE_DB_MAX_ROWS = int(os.getenv("GEMINI_CACHE_DB_MAX_ROWS", 50000))  # au-delà, les plus anciennes partent
+GEMINI_PROMPT_MAX_CHARS = int(os.getenv("GEMINI_PROMPT_MAX_CHARS", 4000))  # prompt par appel (hors instructions)
+
+# Reformulations pré-générées (python -m scripts.build_rephrasing_bank)
+REPHRASING_MODE = os.getenv("REPHRASING_MODE", "bank")  # bank (banque puis Gemini) | live (toujours Gemini)
+REPHRASING_BANK_PATH = os.getenv(
+    "REPHRASING_BANK_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chatbot", "rephrasings.json")
+)
+
+# Sessions de conversation
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # memory | redis | mongo
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", 1000))
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", 1800))  # secondes
+SESSION_COLLECTION_NAME = "sessions"
+CONVERSATION_MAX_HISTORY = int(os.getenv("CONVERSATION_MAX_HISTORY", 50))  # messages gardés par session
+# Contexte envoyé à Gemini : fenêtre de derniers messages + résumé courant, taille bornée
+CONTEXT_WINDOW_MESSAGES = int(os.getenv("CONTEXT_WINDOW_MESSAGES", 6))
+CONTEXT_MAX_CHARS = int(os.getenv("CONTEXT_MAX_CHARS", 1200))             # contexte (résumé + fenêtre)
+CONTEXT_SUMMARY_CHARS = int(os.getenv("CONTEXT_SUMMARY_CHARS", 400))      # résumé des messages plus anciens
+CONTEXT_SUMMARY_ITEM_CHARS = int(os.getenv("CONTEXT_SUMMARY_ITEM_CHARS", 120))  # par message résumé
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Préchargement de la reformulation de la prochaine question (pendant que le client écrit)
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_MAX_IN_FLIGHT = int(os.getenv("PREFETCH_MAX_IN_FLIGHT", 16))  # générations simultanées par processus
+
+# Rechargement à chaud du modèle (vérification du manifeste, en secondes)
+MODEL_WATCH_INTERVAL = int(os.getenv("MODEL_WATCH_INTERVAL", 10))
+
+# Ré-entraînement en processus séparé (python -m models.training_worker)
+TRAIN_NICE = int(os.getenv("TRAIN_NICE", 10))            # priorité CPU abaissée du processus
+TRAIN_CPUS = os.getenv("TRAIN_CPUS", "")                 # ex. "2,3" : cœurs autorisés (vide = tous)
+TRAIN_MEMORY_MB = int(os.getenv("TRAIN_MEMORY_MB", 0))   # plafond d'espace d'adressage (0 = aucun)
+TRAIN_TIMEOUT = int(os.getenv("TRAIN_TIMEOUT", 1800))    # secondes avant d'arrêter l'entraînement
+TRAIN_MODE = os.getenv("TRAIN_MODE", "full")             # full (LogisticRegression) | incremental (SGD partial_fit)
+TRAIN_FULL_REFIT_EVERY = int(os.getenv("TRAIN_FULL_REFIT_EVERY", 20))  # mises à jour avant une refonte complète
+TRAIN_GATE_TOLERANCE = float(os.getenv("TRAIN_GATE_TOLERANCE", 0.01))  # perte de F1 macro tolérée
+TRAIN_MAX_REJECTIONS = int(os.getenv("TRAIN_MAX_REJECTIONS", 3))      # rejets consécutifs avant une refonte complète
+TRAIN_EVAL_SAMPLE = int(os.getenv("TRAIN_EVAL_SAMPLE", 500))          # anciennes conversations évaluées
+
+# Ingestion incrémentale de la base de connaissances (secondes)
+KB_REFRESH_INTERVAL = float(os.getenv("KB_REFRESH_INTERVAL", 5))
+KB_COMPACT_INTERVAL = float(os.getenv("KB_COMPACT_INTERVAL", 3600))  # reconstruction complète
+
+# Recherche dans la base Q/R (python -m scripts.eval_dense_retrieval pour comparer)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "sparse")  # sparse (TF-IDF) | dense (LSA + plus proches voisins)
+LSA_COMPONENTS = int(os.getenv("LSA_COMPONENTS", 128))  # dimensions de la projection LSA
+ANN_BACKEND = os.getenv("ANN_BACKEND", "auto")          # auto (hnsw si hnswlib, sinon ivf) | hnsw | ivf | exact
+ANN_MIN_ITEMS = int(os.getenv("ANN_MIN_ITEMS", 20000))  # auto : recherche exacte en dessous
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", 8))            # listes IVF parcourues par requête
+ANN_EF_SEARCH = int(os.getenv("ANN_EF_SEARCH", 64))     # largeur de recherche HNSW
+DENSE_SIMILARITY_THRESHOLD = float(os.getenv("DENSE_SIMILARITY_THRESHOLD", 0.6))
+# Seuil avec le vectoriseur de recherche dédié (python -m models.retrieval_vectorizer) ;
+# choisi d'après la qualité des réponses par tranche (python -m scripts.measure_fallback_rate)
+RETRIEVAL_SIMILARITY_THRESHOLD = float(os.getenv("RETRIEVAL_SIMILARITY_THRESHOLD", 0.35))
+# Fallback Gemini de la recherche : meilleurs candidats seulement, taille bornée
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", 8))              # paires Q/R candidates
+RAG_MAX_CHARS = int(os.getenv("RAG_MAX_CHARS", 2000))   # caractères de paires dans le prompt (~4 par token)
 
 # Seuil de qualification
 QUALIFICATION_THRESHOLD = 70
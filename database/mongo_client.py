@@ -1,14 +1,123 @@
 # database/mongo_client.py
+import queue
+import threading
+
 from pymongo import MongoClient
-from config.settings import MONGO_URI, DB_NAME, COLLECTION_NAME
+from config.settings import MONGO_URI, DB_NAME, COLLECTION_NAME, MONGO_BATCH_SIZE, MONGO_READ_WORKERS
 
 client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
 leads_collection = db[COLLECTION_NAME]
 
+# Seuls champs lus par l'entraînement et la base de connaissances
+LEAD_PROJECTION = {"status": 1, "messages.sender_type": 1, "messages.text": 1}
+VALID_STATUSES = ("Qualified", "To follow up", "Unqualified")
+
 def save_lead(lead_data):
     return leads_collection.insert_one(lead_data).inserted_id
 
 def get_all_leads():
     """Récupère toutes les conversations depuis MongoDB"""
-    return list(leads_collection.find({}))
\ No newline at end of file
+    return list(leads_collection.find({}))
+
+def _lead_filter(query=None, statuses=None):
+    query = dict(query or {})
+    if statuses:
+        query["status"] = {"$in": list(statuses)}
+    return query
+
+def iter_leads(query=None, statuses=None, projection=LEAD_PROJECTION, batch_size=MONGO_BATCH_SIZE,
+               sort_by_id=False):
+    """
+    Parcourt les conversations en flux (un lot de `batch_size` documents en mémoire
+    à la fois), avec projection sur les champs utiles et filtre de statut côté serveur.
+    """
+    cursor = leads_collection.find(_lead_filter(query, statuses), projection).batch_size(batch_size)
+    if sort_by_id:
+        cursor = cursor.sort("_id", 1)
+    yield from cursor
+
+def sample_leads(size, query=None, statuses=None, projection=LEAD_PROJECTION):
+    """Échantillon aléatoire ($sample côté serveur) de `size` conversations"""
+    return list(leads_collection.aggregate([
+        {"$match": _lead_filter(query, statuses)},
+        {"$sample": {"size": size}},
+        {"$project": projection},
+    ]))
+
+def id_ranges(parts, query=None):
+    """Découpe la collection en `parts` intervalles [début, fin) d'_id de tailles proches"""
+    total = leads_collection.count_documents(query or {})
+    bounds = []
+    for i in range(1, parts):
+        doc = next(leads_collection.find(query or {}, {"_id": 1})
+                   .sort("_id", 1).skip(i * total // parts).limit(1), None)
+        if doc is not None and (not bounds or doc["_id"] != bounds[-1]):
+            bounds.append(doc["_id"])
+    edges = [None] + bounds + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+def iter_leads_parallel(workers=MONGO_READ_WORKERS, query=None, statuses=None, projection=LEAD_PROJECTION,
+                        batch_size=MONGO_BATCH_SIZE):
+    """
+    Comme iter_leads, mais lit `workers` intervalles d'_id en parallèle (un curseur
+    par thread). Ordre non garanti ; la file bornée limite les documents en mémoire.
+    """
+    query = _lead_filter(query, statuses)
+    if workers <= 1:
+        yield from iter_leads(query, projection=projection, batch_size=batch_size)
+        return
+
+    ranges = id_ranges(workers, query)
+    buffer = queue.Queue(maxsize=batch_size * len(ranges))
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        # Attente bornée : abandonne si le consommateur s'est arrêté
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read_range(start, end):
+        id_filter = {}
+        if start is not None:
+            id_filter["$gte"] = start
+        if end is not None:
+            id_filter["$lt"] = end
+        if not id_filter:
+            range_query = query
+        elif "_id" in query:
+            # Condition _id déjà présente (ex. since= de l'entraînement incrémental) : les deux s'appliquent
+            range_query = {"$and": [query, {"_id": id_filter}]}
+        else:
+            range_query = {**query, "_id": id_filter}
+        try:
+            for doc in iter_leads(range_query, projection=projection, batch_size=batch_size):
+                if not put(doc):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(done)
+
+    threads = [threading.Thread(target=read_range, args=r, daemon=True) for r in ranges]
+    for thread in threads:
+        thread.start()
+    try:
+        remaining = len(threads)
+        while remaining:
+            item = buffer.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        # Consommateur arrêté en cours de route : libérer les threads lecteurs
+        stop.set()
@@ -1,47 +1,125 @@
 # models/predictor.py
-import joblib
-import os
-from pathlib import Path
-from .scoring_system import calculate_score_answer
-from chatbot.conversation_engine import QualificationChatbot
+import numpy as np
+import scipy.sparse as sp
+
+from chatbot.knowledge_base import get_knowledge_base
+from models.prefix_features import SEPARATOR, PrefixTfidfFeaturizer
+
+UNKNOWN = ("En cours", 0.0)
 
-PROJECT_ROOT = Path(__file__).parent.parent
-MODEL_PATH = PROJECT_ROOT / "models" / "saved" / "status_predictor.pkl"
 
 class StatusPredictor:
-    def __init__(self):
-        self.model = None
-        self.vectorizer = None
-        self.is_loaded = False
-        self.load_model()
+    def __init__(self, snapshot=None):
+        # Le modèle est partagé via l'instantané du processus (chargé une fois, tableaux en mmap)
+        self._snapshot = snapshot
+        self._featurizer = (None, None)  # (vectorizer, featurizer) du modèle courant
 
-    def load_model(self):
-        try:
-            if not MODEL_PATH.exists():
-                print(f"❌ Modèle non trouvé : {MODEL_PATH}")
-                return
-
-            data = joblib.load(MODEL_PATH)
-            self.model = data["model"]
-            self.vectorizer = data["vectorizer"]
-            self.is_loaded = True
-            print("✅ Modèle de prédiction chargé (LogisticRegression + TF-IDF)")
-        except Exception as e:
-            print(f"❌ Erreur de chargement du modèle : {e}")
+    @property
+    def snapshot(self):
+        return self._snapshot or get_knowledge_base()
+
+    @property
+    def model(self):
+        return self.snapshot.model
+
+    @property
+    def vectorizer(self):
+        return self.snapshot.vectorizer
+
+    @property
+    def is_loaded(self):
+        return self.snapshot.is_loaded
+
+    def _featurizer_for(self, snapshot):
+        vectorizer, featurizer = self._featurizer
+        if vectorizer is not snapshot.vectorizer:
+            featurizer = PrefixTfidfFeaturizer(snapshot.vectorizer)
+            self._featurizer = (snapshot.vectorizer, featurizer)
+        return featurizer
+
+    @staticmethod
+    def _labels(model, X):
+        """Statuts et confiances d'un seul passage predict_proba (label = argmax)"""
+        proba = model.predict_proba(X)
+        best = proba.argmax(axis=1)
+        return [(model.classes_[i], float(p[i])) for i, p in zip(best, proba)]
 
     def predict(self, partial_conversation):
         """
         Prédit le statut du client
         partial_conversation : "msg1 ||| msg2 ||| ..."
         """
-        if not self.is_loaded:
-            return "En cours", 0.0
+        return self.predict_batch([partial_conversation])[0]
+
+    def predict_batch(self, conversations):
+        """
+        Prédit le statut de plusieurs conversations en une passe (une seule
+        vectorisation, un seul predict_proba). Chaque conversation est soit un texte
+        "msg1 ||| msg2", soit la liste de ses messages client.
+        Retourne [(statut, confiance)].
+        """
+        snapshot = self.snapshot
+        if not snapshot.is_loaded:
+            return [UNKNOWN] * len(conversations)
+
+        try:
+            texts = [c if isinstance(c, str) else SEPARATOR.join(c) for c in conversations]
+            return self._labels(snapshot.model, snapshot.vectorizer.transform(texts))
+        except Exception:
+            return [UNKNOWN] * len(conversations)
+
+    # 🔁 Vecteur de features incrémental par session
+
+    def update_features(self, features, client_messages):
+        """
+        Ajoute le dernier message de `client_messages` au vecteur de comptes de la
+        session, sans re-tokeniser l'historique : seuls les n-grammes qui se
+        terminent dans le nouveau message (contexte : derniers tokens gardés) sont
+        comptés. Recalcule depuis l'historique si le modèle a changé.
+        features : [version du modèle, derniers tokens, indices, comptes] ou None.
+        """
+        snapshot = self.snapshot
+        if not snapshot.is_loaded:
+            return None
+
+        featurizer = self._featurizer_for(snapshot)
+        if features is None or features[0] != snapshot.model_version:
+            features, messages = [snapshot.model_version, [], [], []], client_messages
+        else:
+            messages = client_messages[-1:]
+
+        version, tail, indices, counts = features
+        counter = dict(zip(indices, counts))
+        vocabulary = snapshot.vectorizer.vocabulary_
+        for message in messages:
+            tokens = tail + featurizer.tokenize(message)
+            for gram in featurizer.new_ngrams(tokens, len(tail)):
+                idx = vocabulary.get(gram)
+                if idx is not None:
+                    counter[int(idx)] = counter.get(int(idx), 0) + 1
+            tail = tokens[len(tokens) - (featurizer.max_n - 1):] if featurizer.max_n > 1 else []
+
+        indices = sorted(counter)
+        return [version, tail, indices, [counter[i] for i in indices]]
+
+    def predict_features(self, features_list):
+        """Prédit le statut de sessions à partir de leurs vecteurs incrémentaux (en lot)"""
+        snapshot = self.snapshot
+        if not snapshot.is_loaded:
+            return [UNKNOWN] * len(features_list)
 
         try:
-            X = self.vectorizer.transform([partial_conversation])
-            proba = self.model.predict_proba(X)[0]
-            status = self.model.predict(X)[0]
-            confidence = max(proba)
-            return status, confidence
-        except:
-            return "En cours", 0.0
\ No newline at end of file
+            valid = [f for f in features_list if f is not None and f[0] == snapshot.model_version]
+            if len(valid) != len(features_list):
+                raise ValueError("❌ Vecteur de features absent ou d'un autre modèle")
+            indptr = np.cumsum([0] + [len(f[2]) for f in features_list])
+            counts = sp.csr_matrix(
+                (np.concatenate([np.asarray(f[3], dtype=np.float64) for f in features_list]),
+                 np.concatenate([np.asarray(f[2], dtype=np.int32) for f in features_list]),
+                 indptr),
+                shape=(len(features_list), len(snapshot.vectorizer.vocabulary_))
+            )
+            featurizer = self._featurizer_for(snapshot)
+            return self._labels(snapshot.model, featurizer.tfidf(counts))
+        except Exception:
+            return [UNKNOWN] * len(features_list)
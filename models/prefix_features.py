@@ -0,0 +1,185 @@
+# models/prefix_features.py
+from numbers import Integral
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+
+# Séparateur des messages d'un préfixe (format historique des exemples d'entraînement)
+SEPARATOR = " ||| "
+
+
+def prefix_texts(messages):
+    """Préfixes d'une conversation tels que le modèle les voit : "msg1", "msg1 ||| msg2", ..."""
+    return [SEPARATOR.join(messages[:i]) for i in range(1, len(messages) + 1)]
+
+
+class PrefixTfidfFeaturizer:
+    """
+    Produit la matrice TF-IDF de tous les préfixes de conversations sans jamais
+    construire ni re-tokeniser les textes joints (coût quadratique en nombre de messages).
+
+    Chaque message est tokenisé une seule fois ; la ligne d'un préfixe est celle du
+    préfixe précédent plus les n-grammes qui se terminent dans le nouveau message
+    (y compris ceux qui chevauchent la frontière avec le message d'avant). Le cumul
+    est une somme creuse par bloc de conversation. Le séparateur ne contient aucun
+    caractère de token, d'où une matrice identique à `vectorizer.fit_transform` sur
+    les textes joints (vocabulaire, sélection max_features et idf compris).
+    """
+
+    def __init__(self, vectorizer):
+        if vectorizer.analyzer != "word" or vectorizer.stop_words is not None or vectorizer.binary:
+            raise ValueError("❌ Seul l'analyseur 'word' sans stop words ni binary est supporté")
+        self.vectorizer = vectorizer
+        self.transformer = None
+        self.min_n, self.max_n = vectorizer.ngram_range
+        self._preprocess = vectorizer.build_preprocessor()
+        self._tokenize = vectorizer.build_tokenizer()
+
+    def tokenize(self, message):
+        return self._tokenize(self._preprocess(message))
+
+    def new_ngrams(self, tokens, start):
+        """
+        n-grammes de `tokens` dont le dernier token est à une position >= start,
+        dans l'ordre de l'analyseur sklearn (tous les unigrammes, puis les bigrammes...)
+        """
+        for n in range(self.min_n, self.max_n + 1):
+            for end in range(max(start, n - 1), len(tokens)):
+                yield " ".join(tokens[end - n + 1:end + 1])
+
+    def _delta_counts(self, conversations, vocabulary, fixed_vocabulary):
+        """Matrice des n-grammes ajoutés par chaque message (une ligne par préfixe)"""
+        indices, values, indptr, block_sizes = [], [], [0], []
+        for messages in conversations:
+            tokens = []
+            for message in messages:
+                start = len(tokens)
+                tokens.extend(self.tokenize(message))
+                counter = {}
+                for gram in self.new_ngrams(tokens, start):
+                    idx = vocabulary.get(gram)
+                    if idx is None:
+                        if fixed_vocabulary:
+                            continue
+                        idx = vocabulary[gram] = len(vocabulary)
+                    counter[idx] = counter.get(idx, 0) + 1
+                indices.extend(counter.keys())
+                values.extend(counter.values())
+                indptr.append(len(indices))
+            block_sizes.append(len(messages))
+
+        delta = sp.csr_matrix(
+            (np.asarray(values, dtype=self.vectorizer.dtype),
+             np.asarray(indices, dtype=np.int32),
+             np.asarray(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, len(vocabulary))
+        )
+        return delta, block_sizes
+
+    @staticmethod
+    def _cumulative(delta, block_sizes):
+        """Somme cumulée des lignes à l'intérieur de chaque conversation (triangulaire par blocs)"""
+        rows, cols, offset = [], [], 0
+        for size in block_sizes:
+            r, c = np.tril_indices(size)
+            rows.append(r + offset)
+            cols.append(c + offset)
+            offset += size
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+        cumulative = sp.csr_matrix((np.ones(len(rows), dtype=delta.dtype), (rows, cols)), shape=(offset, offset))
+        counts = (cumulative @ delta).tocsr()
+        counts.sort_indices()
+        return counts
+
+    def count_matrix(self, conversations, vocabulary=None):
+        """
+        Comptes de n-grammes de chaque préfixe. Sans `vocabulary`, le vocabulaire est
+        appris et les colonnes sont triées alphabétiquement (ordre de CountVectorizer).
+        Retourne (comptes, vocabulaire terme → colonne).
+        """
+        fixed_vocabulary = vocabulary is not None
+        vocabulary = dict(vocabulary) if fixed_vocabulary else {}
+        delta, block_sizes = self._delta_counts(conversations, vocabulary, fixed_vocabulary)
+        counts = self._cumulative(delta, block_sizes)
+        if not fixed_vocabulary:
+            if not vocabulary:
+                raise ValueError("❌ Vocabulaire vide : aucun token dans les conversations")
+            # Comme CountVectorizer._sort_features : colonnes renumérotées sans retrier
+            # les indices de chaque ligne (l'ordre d'apparition est conservé, et avec lui
+            # l'ordre de sommation de la normalisation → résultat identique au bit près)
+            remap = np.empty(len(vocabulary), dtype=counts.indices.dtype)
+            for new_idx, term in enumerate(sorted(vocabulary)):
+                remap[vocabulary[term]] = new_idx
+                vocabulary[term] = new_idx
+            counts.indices = remap.take(counts.indices, mode="clip")
+        return counts, vocabulary
+
+    def _limit_features(self, counts, vocabulary):
+        """Même élagage que CountVectorizer (max_df, min_df, max_features), à l'identique"""
+        v = self.vectorizer
+        n_doc = counts.shape[0]
+        high = v.max_df if isinstance(v.max_df, Integral) else v.max_df * n_doc
+        low = v.min_df if isinstance(v.min_df, Integral) else v.min_df * n_doc
+        if high < low:
+            raise ValueError("max_df corresponds to < documents than min_df")
+
+        dfs = np.bincount(counts.indices, minlength=counts.shape[1])
+        mask = (dfs <= high) & (dfs >= low)
+        if v.max_features is not None and mask.sum() > v.max_features:
+            tfs = np.asarray(counts.sum(axis=0)).ravel()
+            mask_inds = (-tfs[mask]).argsort()[:v.max_features]
+            new_mask = np.zeros(len(dfs), dtype=bool)
+            new_mask[np.where(mask)[0][mask_inds]] = True
+            mask = new_mask
+
+        new_indices = np.cumsum(mask) - 1
+        vocabulary = {term: new_indices[idx] for term, idx in vocabulary.items() if mask[idx]}
+        kept_indices = np.where(mask)[0]
+        if len(kept_indices) == 0:
+            raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+        return counts[:, kept_indices], vocabulary
+
+    def fit_transform(self, conversations):
+        """
+        Apprend vocabulaire et idf sur les préfixes de `conversations` (listes de
+        messages client) et retourne leur matrice TF-IDF. Le vectorizer est ensuite
+        utilisable tel quel pour la prédiction (transform sur un texte joint).
+        """
+        counts, vocabulary = self.count_matrix(conversations)
+        counts, vocabulary = self._limit_features(counts, vocabulary)
+
+        v = self.vectorizer
+        self.transformer = TfidfTransformer(
+            norm=v.norm, use_idf=v.use_idf, smooth_idf=v.smooth_idf, sublinear_tf=v.sublinear_tf
+        ).fit(counts)
+        v.vocabulary_ = vocabulary
+        if v.use_idf:
+            v.idf_ = self.transformer.idf_
+        return self.transformer.transform(counts, copy=False)
+
+    def tfidf(self, counts):
+        """Pondération TF-IDF et normalisation de comptes (vocabulaire déjà appris)"""
+        v = self.vectorizer
+        if self.transformer is None:
+            # Vectorizer déjà ajusté ailleurs (modèle chargé depuis le registre)
+            transformer = TfidfTransformer(
+                norm=v.norm, use_idf=v.use_idf, smooth_idf=v.smooth_idf, sublinear_tf=v.sublinear_tf
+            )
+            if v.use_idf:
+                transformer.idf_ = v.idf_
+            self.transformer = transformer
+        return self.transformer.transform(counts, copy=False)
+
+    def transform(self, conversations):
+        """Matrice TF-IDF des préfixes avec le vocabulaire et l'idf déjà appris"""
+        counts, _ = self.count_matrix(conversations, self.vectorizer.vocabulary_)
+        return self.tfidf(counts)
+
+
+def fit_prefix_tfidf(conversations, **vectorizer_params):
+    """Raccourci : (vectorizer ajusté, matrice TF-IDF des préfixes)"""
+    featurizer = PrefixTfidfFeaturizer(TfidfVectorizer(**vectorizer_params))
+    X_vec = featurizer.fit_transform(conversations)
+    return featurizer.vectorizer, X_vec
@@ -0,0 +1,336 @@
+# models/registry.py
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+# Chemins du modèle et de son manifeste (version + empreinte)
+PROJECT_ROOT = Path(__file__).parent.parent
+MODEL_DIR = PROJECT_ROOT / "models" / "saved"
+MODEL_PATH = MODEL_DIR / "status_predictor.pkl"
+MANIFEST_PATH = MODEL_DIR / "status_predictor.json"
+ARTIFACTS_DIR = MODEL_DIR / "artifacts"
+# Vectoriseur de la recherche Q/R (python -m models.retrieval_vectorizer)
+RETRIEVAL_MANIFEST_PATH = MODEL_DIR / "retrieval_vectorizer.json"
+RETRIEVAL_DIR = MODEL_DIR / "retrieval"
+
+# Versions compactes conservées (les processus qui les ont encore en mmap restent valides)
+KEEP_VERSIONS = 3
+VERSION_MANIFEST = "manifest.json"  # copie du manifeste dans le dossier de chaque version
+
+# Estimateurs reconstruits depuis le format compact (tableaux .npy)
+ESTIMATORS = {"LogisticRegression": LogisticRegression, "SGDClassifier": SGDClassifier}
+ESTIMATOR_SCALARS = ("t_",)  # état de partial_fit (SGD) à conserver
+VECTORIZER_PARAMS = (
+    "analyzer", "binary", "lowercase", "max_df", "max_features", "min_df", "ngram_range",
+    "norm", "smooth_idf", "strip_accents", "sublinear_tf", "token_pattern", "use_idf"
+)
+
+
+class ModelIntegrityError(Exception):
+    """Le fichier du modèle ne correspond pas à l'empreinte du manifeste"""
+
+
+def _atomic_write(path, payload):
+    """Écrit dans un fichier temporaire du même dossier, fsync, puis rename atomique"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _is_compact(artifact):
+    model, vectorizer = artifact.get("model"), artifact.get("vectorizer")
+    return (type(model).__name__ in ESTIMATORS and hasattr(model, "coef_")
+            and isinstance(vectorizer, TfidfVectorizer) and hasattr(vectorizer, "vocabulary_")
+            and vectorizer.tokenizer is None and vectorizer.preprocessor is None
+            and vectorizer.stop_words is None)
+
+
+def _vectorizer_arrays(vectorizer):
+    """Tableaux et paramètres d'un TfidfVectorizer ajusté (format compact)"""
+    # Termes UTF-8 séparés par "\n", dans l'ordre des colonnes (aucun n-gramme ne
+    # contient de saut de ligne : l'analyseur normalise les espaces)
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, column in vectorizer.vocabulary_.items():
+        terms[column] = term
+    arrays = {"vocabulary": np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8)}
+    if vectorizer.use_idf:
+        arrays["idf"] = np.asarray(vectorizer.idf_)
+    meta = {
+        "vectorizer_params": {k: getattr(vectorizer, k) for k in VECTORIZER_PARAMS},
+        "vectorizer_dtype": np.dtype(vectorizer.dtype).name,
+    }
+    return arrays, meta
+
+
+def _compact_arrays(artifact):
+    """Tableaux du format compact + métadonnées nécessaires pour reconstruire les objets"""
+    model, vectorizer = artifact["model"], artifact["vectorizer"]
+    arrays, meta = _vectorizer_arrays(vectorizer)
+    arrays.update({
+        "coef": np.ascontiguousarray(model.coef_),
+        "intercept": np.asarray(model.intercept_),
+        "classes": np.asarray(model.classes_).astype(str),
+    })
+
+    params = model.get_params()
+    if isinstance(params.get("class_weight"), dict):
+        params["class_weight"] = {str(k): float(v) for k, v in params["class_weight"].items()}
+    meta.update({
+        "estimator": type(model).__name__,
+        "estimator_params": params,
+        "estimator_scalars": {k: float(getattr(model, k)) for k in ESTIMATOR_SCALARS if hasattr(model, k)},
+        "classes": list(artifact.get("classes", [])),
+    })
+    return arrays, meta
+
+
+def _write_compact(root, arrays, meta):
+    """Écrit le dossier de la version (temporaire puis rename atomique) ; retourne (dossier, empreintes)"""
+    root.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=root, prefix=".tmp-"))
+    try:
+        for name, array in arrays.items():
+            with open(tmp_dir / f"{name}.npy", "wb") as f:
+                np.save(f, array, allow_pickle=False)
+                f.flush()
+                os.fsync(f.fileno())
+        with open(tmp_dir / "meta.json", "wb") as f:
+            f.write(json.dumps(meta, indent=2).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        files = {path.name: _sha256_file(path) for path in sorted(tmp_dir.iterdir())}
+        checksum = hashlib.sha256(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest()
+        return tmp_dir, files, checksum
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def _version_age(directory):
+    """Clé de tri : date de publication (copie du manifeste), puis mtime pour départager"""
+    manifest_copy = directory / VERSION_MANIFEST
+    try:
+        mtime = manifest_copy.stat().st_mtime_ns
+    except FileNotFoundError:
+        mtime = directory.stat().st_mtime_ns
+    manifest = _read_json(manifest_copy) or {}
+    return manifest.get("created_at", ""), mtime
+
+
+def _prune_versions(root, manifest_path, keep=KEEP_VERSIONS):
+    """Garde les `keep` versions les plus récentes ; la version pointée par le manifeste n'est jamais supprimée"""
+    current = (_read_json(manifest_path) or {}).get("path")
+    versions = sorted((p for p in root.iterdir() if p.is_dir() and not p.name.startswith(".")),
+                      key=_version_age)
+    for old in versions[:-keep]:
+        if current and old == MODEL_DIR / current:
+            continue
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def _publish_compact(root, manifest_path, arrays, meta, metadata, created_at):
+    """Publie un dossier de tableaux versionné puis son manifeste ; retourne le manifeste"""
+    tmp_dir, files, checksum = _write_compact(root, arrays, meta)
+    version = f"{created_at.strftime('%Y%m%dT%H%M%S')}-{checksum[:8]}"
+    target = root / version
+    if target.exists():
+        shutil.rmtree(target)  # même contenu republié dans la même seconde
+    os.rename(tmp_dir, target)
+    manifest = {
+        "version": version,
+        "format": "npy",
+        "path": str(target.relative_to(MODEL_DIR)),
+        "files": files,
+        "sha256": checksum,
+        "size_bytes": sum((target / name).stat().st_size for name in files),
+        "created_at": created_at.isoformat(timespec="seconds"),
+        **(metadata or {}),
+    }
+    payload = json.dumps(manifest, indent=2).encode("utf-8")
+    _atomic_write(target / VERSION_MANIFEST, payload)  # date de la version, lue par _prune_versions
+    _atomic_write(manifest_path, payload)
+    _prune_versions(root, manifest_path)
+    return manifest
+
+
+def save_model(artifact, metadata=None):
+    """
+    Publie un nouveau modèle puis son manifeste, chacun remplacé atomiquement.
+    Format compact (tableaux .npy chargés en mmap) pour les modèles linéaires
+    TF-IDF ; pickle joblib sinon. Retourne le manifeste (version, empreintes, date...).
+    """
+    created_at = datetime.now()
+    if _is_compact(artifact):
+        arrays, meta = _compact_arrays(artifact)
+        return _publish_compact(ARTIFACTS_DIR, MANIFEST_PATH, arrays, meta, metadata, created_at)
+
+    buffer = io.BytesIO()
+    joblib.dump(artifact, buffer)
+    payload = buffer.getvalue()
+    checksum = hashlib.sha256(payload).hexdigest()
+    manifest = {
+        "version": f"{created_at.strftime('%Y%m%dT%H%M%S')}-{checksum[:8]}",
+        "format": "joblib",
+        "sha256": checksum,
+        "size_bytes": len(payload),
+        "created_at": created_at.isoformat(timespec="seconds"),
+        **(metadata or {}),
+    }
+    _atomic_write(MODEL_PATH, payload)
+    _atomic_write(MANIFEST_PATH, json.dumps(manifest, indent=2).encode("utf-8"))
+    return manifest
+
+
+def save_retrieval_vectorizer(vectorizer, metadata=None):
+    """Publie le vectoriseur de recherche (versionné indépendamment du modèle de statut)"""
+    arrays, meta = _vectorizer_arrays(vectorizer)
+    return _publish_compact(RETRIEVAL_DIR, RETRIEVAL_MANIFEST_PATH, arrays, meta, metadata, datetime.now())
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def read_manifest():
+    """Manifeste courant, ou None (ancien modèle publié sans manifeste)"""
+    return _read_json(MANIFEST_PATH)
+
+
+def annotate_manifest(**fields):
+    """Ajoute des champs au manifeste courant (même version : les workers ne rechargent pas)"""
+    manifest = read_manifest()
+    if manifest is None:
+        return None
+    manifest.update(fields)
+    _atomic_write(MANIFEST_PATH, json.dumps(manifest, indent=2).encode("utf-8"))
+    return manifest
+
+
+def read_retrieval_manifest():
+    """Manifeste du vectoriseur de recherche, ou None (pas encore construit)"""
+    return _read_json(RETRIEVAL_MANIFEST_PATH)
+
+
+def current_version():
+    manifest = read_manifest()
+    return manifest["version"] if manifest else None
+
+
+def model_exists():
+    manifest = read_manifest()
+    if manifest and manifest.get("format") == "npy":
+        return (MODEL_DIR / manifest["path"]).is_dir()
+    return MODEL_PATH.exists()
+
+
+def model_location():
+    """Chemin du modèle publié (dossier compact ou pickle), pour les messages"""
+    manifest = read_manifest()
+    if manifest and manifest.get("format") == "npy":
+        return MODEL_DIR / manifest["path"]
+    return MODEL_PATH
+
+
+def _open_compact(manifest, mmap_mode):
+    """Vérifie les empreintes d'une version ; retourne (meta, chargeur de tableaux)"""
+    directory = MODEL_DIR / manifest["path"]
+    for name, checksum in manifest["files"].items():
+        if _sha256_file(directory / name) != checksum:
+            raise ModelIntegrityError(f"❌ Empreinte invalide pour {name} (version {manifest['version']})")
+
+    with open(directory / "meta.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    def array(name):
+        return np.load(directory / f"{name}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+
+    return meta, array
+
+
+def _vectorizer_from(meta, array):
+    vectorizer_params = dict(meta["vectorizer_params"])
+    vectorizer_params["ngram_range"] = tuple(vectorizer_params["ngram_range"])
+    vectorizer = TfidfVectorizer(dtype=np.dtype(meta["vectorizer_dtype"]).type, **vectorizer_params)
+    terms = array("vocabulary").tobytes().decode("utf-8").split("\n")
+    vectorizer.vocabulary_ = {term: column for column, term in enumerate(terms)}
+    if vectorizer.use_idf:
+        vectorizer.idf_ = array("idf")
+    return vectorizer
+
+
+def _load_compact(manifest, mmap_mode):
+    meta, array = _open_compact(manifest, mmap_mode)
+    vectorizer = _vectorizer_from(meta, array)
+
+    model = ESTIMATORS[meta["estimator"]](**meta["estimator_params"])
+    model.coef_ = array("coef")
+    model.intercept_ = array("intercept")
+    model.classes_ = np.asarray(array("classes"), dtype=object)
+    model.n_features_in_ = model.coef_.shape[1]
+    for name, value in meta["estimator_scalars"].items():
+        setattr(model, name, value)
+
+    return {"model": model, "vectorizer": vectorizer, "classes": meta["classes"]}
+
+
+def load_model(mmap_mode="r"):
+    """
+    Seul chargeur du modèle publié, utilisé partout. Vérifie les empreintes.
+    Format compact : coefficients et idf en mmap (pages partagées entre processus) ;
+    `mmap_mode=None` pour des tableaux modifiables (partial_fit).
+    Retourne (artefact, version) ; version "legacy" si aucun manifeste n'existe.
+    """
+    manifest = read_manifest()
+    if manifest and manifest.get("format") == "npy":
+        return _load_compact(manifest, mmap_mode), manifest["version"]
+
+    with open(MODEL_PATH, "rb") as f:
+        payload = f.read()
+    if manifest is None:
+        return joblib.load(io.BytesIO(payload)), "legacy"
+    if hashlib.sha256(payload).hexdigest() != manifest["sha256"]:
+        raise ModelIntegrityError(f"❌ Empreinte invalide pour la version {manifest['version']}")
+    return joblib.load(io.BytesIO(payload)), manifest["version"]
+
+
+def load_retrieval_vectorizer(mmap_mode="r"):
+    """
+    Vectoriseur de recherche publié (idf en mmap, empreintes vérifiées).
+    Retourne (vectoriseur, version), ou (None, None) s'il n'a jamais été construit.
+    """
+    manifest = read_retrieval_manifest()
+    if manifest is None:
+        return None, None
+    meta, array = _open_compact(manifest, mmap_mode)
+    return _vectorizer_from(meta, array), manifest["version"]
@@ -0,0 +1,51 @@
+# models/retrieval_vectorizer.py
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from chatbot.knowledge_base import load_from_mongodb
+from chatbot.normalization import clean_text
+from models.registry import save_retrieval_vectorizer
+
+# ✅ N-grammes de caractères (dans les mots) sur le texte nettoyé : accents
+# ("économie", "prè") et variantes d'écriture en arabizi gardent des n-grammes
+# communs, contrairement aux tokens [a-zA-Z0-9]+ du modèle de statut.
+RETRIEVAL_TFIDF_PARAMS = dict(
+    analyzer="char_wb",
+    ngram_range=(2, 4),
+    sublinear_tf=True,   # ← un n-gramme répété dans une longue question ne domine pas
+    lowercase=True,
+)
+
+
+def fit_retrieval_vectorizer(cleaned_questions, **params):
+    """Vectoriseur de recherche ajusté sur les questions (déjà passées par clean_text)"""
+    vectorizer = TfidfVectorizer(**{**RETRIEVAL_TFIDF_PARAMS, **params})
+    vectorizer.fit([q for q in cleaned_questions if q])
+    return vectorizer
+
+
+def train_retrieval_vectorizer():
+    """
+    Ajuste le vectoriseur de recherche sur les questions de la base Q/R et le publie
+    dans le registre, versionné indépendamment du modèle de statut. Les instances
+    en cours le rechargent via le surveillant de modèle.
+    """
+    pairs, high_water_mark = load_from_mongodb()
+    cleaned = [clean_text(pair["question"]) for pair in pairs]
+    if not any(cleaned):
+        print("❌ Aucune question dans la base : vectoriseur non publié")
+        return False
+
+    vectorizer = fit_retrieval_vectorizer(cleaned)
+    manifest = save_retrieval_vectorizer(vectorizer, metadata={
+        "questions": len(cleaned),
+        "features": len(vectorizer.vocabulary_),
+        "high_water_mark": str(high_water_mark) if high_water_mark is not None else None,
+    })
+    print(f"✅ Vectoriseur de recherche publié ({vectorizer.analyzer}, n-grammes {vectorizer.ngram_range})")
+    print(f"   → Questions : {len(cleaned)}, n-grammes : {len(vectorizer.vocabulary_)}")
+    print(f"   → Version : {manifest['version']}")
+    return True
+
+
+if __name__ == "__main__":
+    train_retrieval_vectorizer()
@@ -1,10 +1,129 @@
 # models/scoring_system.py
+import re
+from collections import namedtuple
+
+# Mots (les nombres décimaux comme "16.5" restent un seul token)
+TOKEN_PATTERN = re.compile(r"\w+(?:\.\w+)*")
+
+# Particules de négation : "le najem" annule "najem" même si la variante n'est pas listée
+NEGATION_TOKENS = frozenset({"le", "la", "lé", "ma", "mch", "mech", "moch", "mouch", "machi", "non", "no", "pas"})
+
+# Mot-clé retenu pour une réponse : span = (début, fin) en caractères dans la réponse
+KeywordMatch = namedtuple("KeywordMatch", ["keyword", "score", "span", "negated"])
+
+_END = None  # clé de fin de mot-clé dans le trie (les tokens sont des chaînes)
+
+
+def tokenize(text):
+    """Tokens du texte en minuscules"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class KeywordMatcher:
+    """
+    Trie de tokens des mots-clés d'une question, compilé une fois au chargement de
+    questions.json. Les mots-clés ne correspondent qu'à des mots entiers ("la" ne
+    trouve plus rien dans "balehi") et toutes les occurrences sont trouvées en une passe.
+
+    Règle de résolution entre plusieurs occurrences :
+      1. la plus longue (en tokens) ;
+      2. un mot-clé explicite avant une négation déduite ("le" + mot-clé positif) ;
+      3. le score le plus bas (prudence) ;
+      4. la première dans la réponse.
+    """
+
+    def __init__(self, keywords, default_score=0):
+        self.default_score = default_score
+        self.trie = {}
+        for keyword, score in keywords.items():
+            node = self.trie
+            for token in tokenize(keyword):
+                node = node.setdefault(token, {})
+            node[_END] = (keyword, score)
+        # Score d'un mot-clé positif précédé d'une négation
+        self.negated_score = min(keywords.values(), default=default_score)
+
+    @classmethod
+    def from_question(cls, question_data):
+        return cls(question_data["keywords"], question_data.get("default_score", 0))
+
+    def _candidates(self, tokens):
+        """
+        Toutes les occurrences, négations déduites comprises, sous forme de tuples
+        ordonnés selon la règle de résolution :
+        (-longueur, négation déduite, score, début, fin, mot-clé) — indices en tokens.
+        """
+        candidates = []
+        root = self.trie
+        for start, token in enumerate(tokens):
+            node, end = root.get(token), start + 1
+            while node is not None:
+                if _END in node:
+                    keyword, score = node[_END]
+                    candidates.append((start - end, False, score, start, end, keyword))
+                    if score > self.negated_score and start > 0 and tokens[start - 1] in NEGATION_TOKENS:
+                        candidates.append((start - 1 - end, True, self.negated_score, start - 1, end,
+                                           f"{tokens[start - 1]} {keyword}"))
+                if end == len(tokens):
+                    break
+                node, end = node.get(tokens[end]), end + 1
+        return candidates
+
+    @staticmethod
+    def _to_match(candidate, spans):
+        _, negated, score, start, end, keyword = candidate
+        return KeywordMatch(keyword, score, (spans[start][0], spans[end - 1][1]), negated)
+
+    def find_all(self, text):
+        """Toutes les occurrences (y compris les négations déduites), span en caractères"""
+        lowered = text.lower()
+        spans = [m.span() for m in TOKEN_PATTERN.finditer(lowered)]
+        return [self._to_match(c, spans) for c in self._candidates(TOKEN_PATTERN.findall(lowered))]
+
+    def best_match(self, text):
+        """Occurrence retenue selon la règle de résolution, ou None"""
+        lowered = text.lower()
+        candidates = self._candidates(TOKEN_PATTERN.findall(lowered))
+        if not candidates:
+            return None
+        # Spans calculés seulement pour l'occurrence retenue
+        spans = [m.span() for m in TOKEN_PATTERN.finditer(lowered)]
+        return self._to_match(min(candidates), spans)
+
+    def best_match_many(self, texts):
+        """Meilleure occurrence sur plusieurs messages : (index du message, KeywordMatch) ou None"""
+        best = None
+        for index, text in enumerate(texts):
+            lowered = text.lower()
+            candidates = self._candidates(TOKEN_PATTERN.findall(lowered))
+            if candidates:
+                candidate = min(candidates)
+                if best is None or candidate < best[0]:
+                    best = (candidate, index, lowered)
+        if best is None:
+            return None
+        candidate, index, lowered = best
+        spans = [m.span() for m in TOKEN_PATTERN.finditer(lowered)]
+        return index, self._to_match(candidate, spans)
+
+    def score(self, text):
+        candidates = self._candidates(tokenize(text))
+        return min(candidates)[2] if candidates else self.default_score
+
+
+def qualification_status(score, threshold):
+    """Statut final d'après le score cumulé (même règle que la fin du questionnaire)"""
+    if score >= threshold:
+        return "Qualified"
+    if score >= threshold * 0.5:
+        return "To follow up"
+    return "Unqualified"
+
+
+def compile_matchers(questions):
+    return [KeywordMatcher.from_question(q) for q in questions]
+
+
 def calculate_score_answer(question_data, user_answer):
-    user_answer = user_answer.lower()
-    keywords = question_data["keywords"]
-    default_score = question_data.get("default_score", 0)
-
-    for keyword, score in keywords.items():
-        if keyword in user_answer:
-            return score
-    return default_score
\ No newline at end of file
+    """Score d'une réponse (compile le matcher à chaque appel : préférer compile_matchers)"""
+    return KeywordMatcher.from_question(question_data).score(user_answer)
@@ -1,104 +1,267 @@
 # models/train_predictor.py
-import joblib
+import copy
 import os
-from pathlib import Path
+import zlib
+
+import numpy as np
+from bson import ObjectId
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression  # ← Changé ici
+from sklearn.linear_model import LogisticRegression, SGDClassifier  # ← Changé ici
+from sklearn.metrics import f1_score
+from sklearn.utils.class_weight import compute_class_weight
+
+from config.settings import (
+    TRAIN_MODE, TRAIN_FULL_REFIT_EVERY, TRAIN_GATE_TOLERANCE, TRAIN_EVAL_SAMPLE, TRAIN_MAX_REJECTIONS
+)
+from models.prefix_features import PrefixTfidfFeaturizer
 
 # Importer la fonction depuis mongo_client
-from database.mongo_client import get_all_leads
+from database.mongo_client import VALID_STATUSES, iter_leads_parallel, sample_leads
+from models.registry import annotate_manifest, load_model, model_location, read_manifest, save_model
+
+# Résultat de train_predictor : mise à jour refusée par l'évaluation, version courante conservée
+REJECTED = "rejected"
+
+# ✅ TF-IDF optimisé pour le dialecte tunisien
+TFIDF_PARAMS = dict(
+    ngram_range=(1, 3),              # ← 1,2,3-grams pour capturer les phrases
+    max_features=10000,              # ← Plus de features
+    lowercase=True,
+    stop_words=None,
+    token_pattern=r'\b[a-zA-Z0-9]+\b'  # ← Garde les mots avec chiffres (ex: "10.5", "bac")
+)
+
+def client_messages(conv):
+    """Messages texte du client (contact) d'une conversation"""
+    return [
+        msg["text"] for msg in conv.get("messages", [])
+        if isinstance(msg, dict)
+        and msg.get("sender_type") == "contact"
+        and msg.get("text")
+    ]
 
-# 🔧 Définir le chemin absolu du projet
-PROJECT_ROOT = Path(__file__).parent.parent
-MODEL_SAVE_PATH = PROJECT_ROOT / "models" / "saved" / "status_predictor.pkl"
 
-def generate_training_data():
+def generate_training_data(since=None):
     """
     Génère les données d'entraînement depuis MongoDB
-    X = ["msg1", "msg1 ||| msg2", ...]
-    y = [statut]
+    conversations = [["msg1", "msg2", ...], ...]  (messages client)
+    y = [statut]  (un par préfixe : "msg1", "msg1 ||| msg2", ...)
+    ids = [_id]  (un par conversation)
+    `since` : ne lit que les conversations d'_id strictement supérieur (mode incrémental)
     """
     print("🔍 Chargement des conversations depuis MongoDB...")
+    conversations, y, ids = [], [], []
+    conversation_count = 0
+    query = {"_id": {"$gt": since}} if since is not None else None
+
     try:
-        conversations = get_all_leads()
+        # Lecture en flux, statuts filtrés côté serveur : seuls les exemples restent en mémoire
+        for conv in iter_leads_parallel(query=query, statuses=VALID_STATUSES):
+            conversation_count += 1
+            client_msgs = client_messages(conv)
+
+            if not client_msgs:
+                continue
+
+            # Les préfixes ne sont plus matérialisés : voir PrefixTfidfFeaturizer
+            conversations.append(client_msgs)
+            y.extend([conv["status"]] * len(client_msgs))
+            ids.append(conv["_id"])
     except Exception as e:
         raise Exception(f"❌ Échec de chargement depuis MongoDB : {e}")
 
-    if not conversations:
+    if not conversation_count and since is None:
         raise Exception("❌ Aucune conversation trouvée. As-tu importé les données ?")
 
-    X, y = [], []
-    valid_statuses = {"Qualified", "To follow up", "Unqualified"}
+    print(f"✅ {len(y)} exemples générés à partir de {conversation_count} conversations")
+    return conversations, y, ids
+
+
+def _no_progress(stage):
+    pass
+
+
+def _parse_id(value):
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+
+def _new_model(estimator, y):
+    if estimator == "sgd":
+        # partial_fit n'accepte pas class_weight="balanced" : poids figés à la refonte complète
+        classes = np.unique(y)
+        weights = compute_class_weight("balanced", classes=classes, y=np.asarray(y))
+        return SGDClassifier(
+            loss="log_loss",                 # ← predict_proba, comme la régression logistique
+            alpha=1e-5,
+            class_weight=dict(zip(classes, weights)),
+            max_iter=50,
+            tol=1e-4,
+            random_state=42
+        )
+
+    # ✅ Modèle : Logistic Regression (meilleure calibration que RF)
+    return LogisticRegression(
+        random_state=42,
+        class_weight="balanced",         # ← Compense les déséquilibres de classes
+        max_iter=1000,
+        C=1.0                            # ← Régularisation standard
+    )
+
+
+def _full_refit(on_progress, estimator):
+    """Vocabulaire, idf et modèle réappris sur tout l'historique"""
+    on_progress("chargement")
+    conversations, y, ids = generate_training_data()
+
+    if len(y) < 5:
+        raise ValueError("❌ Pas assez de données pour entraîner (minimum 5 exemples)")
 
-    for conv in conversations:
-        status = conv.get("status")
-        if not status or status not in valid_statuses:
-            continue
+    # Matrice identique à TfidfVectorizer(**TFIDF_PARAMS).fit_transform(préfixes joints),
+    # en temps linéaire dans la longueur des conversations
+    on_progress("features")
+    featurizer = PrefixTfidfFeaturizer(TfidfVectorizer(**TFIDF_PARAMS))
+    X_vec = featurizer.fit_transform(conversations)
+    vectorizer = featurizer.vectorizer
 
-        client_msgs = [
-            msg["text"] for msg in conv.get("messages", [])
-            if isinstance(msg, dict)
-            and msg.get("sender_type") == "contact"
-            and msg.get("text")
-        ]
+    model = _new_model(estimator, y)
+    on_progress("apprentissage")
+    model.fit(X_vec, y)
 
-        if not client_msgs:
-            continue
+    # ✅ Sauvegarde (écriture atomique + manifeste versionné)
+    on_progress("sauvegarde")
+    manifest = save_model({
+        "model": model,
+        "vectorizer": vectorizer,
+        "classes": sorted(list(set(y)))
+    }, metadata={
+        "samples": len(y),
+        "mode": "full",
+        "estimator": estimator,
+        "high_water_mark": str(max(ids)),
+        "updates": 0,
+    })
 
-        for i in range(1, len(client_msgs) + 1):
-            partial = " ||| ".join(client_msgs[:i])
-            X.append(partial)
-            y.append(status)
+    print(f"✅ Modèle {estimator.upper()} entraîné avec succès !")
+    print(f"   → Échantillons : {len(y)}")
+    print(f"   → Classes : {sorted(list(set(y)))}")
+    print(f"   → N-grams : {vectorizer.ngram_range}")
+    print(f"   → Sauvegardé dans : {model_location()}")
+    print(f"   → Version : {manifest['version']}")
+    return True
 
-    print(f"✅ {len(X)} exemples générés à partir de {len(conversations)} conversations")
-    return X, y
 
+def _is_held_out(conversation_id, folds=5):
+    """Une nouvelle conversation sur `folds` sert à l'évaluation, jamais à l'apprentissage"""
+    return zlib.crc32(str(conversation_id).encode("utf-8")) % folds == 0
 
-def train_predictor():
+
+def _evaluation_set(held_out, since):
+    """Nouvelles conversations mises de côté + échantillon d'anciennes (détecte l'oubli)"""
+    conversations, y = [], []
+    older = sample_leads(TRAIN_EVAL_SAMPLE, {"_id": {"$lte": since}}, statuses=VALID_STATUSES)
+    for messages, status in held_out + [(client_messages(conv), conv["status"]) for conv in older]:
+        if messages:
+            conversations.append(messages)
+            y.extend([status] * len(messages))
+    return conversations, y
+
+
+def _incremental_update(on_progress, manifest):
     """
-    Entraîne un modèle LogisticRegression avec un TF-IDF optimisé
+    partial_fit du modèle courant sur les seules conversations arrivées depuis
+    le dernier entraînement (vocabulaire et idf figés), puis promotion uniquement
+    si le F1 macro ne se dégrade pas au-delà de TRAIN_GATE_TOLERANCE.
     """
-    try:
-        X, y = generate_training_data()
-
-        if len(X) < 5:
-            raise ValueError("❌ Pas assez de données pour entraîner (minimum 5 exemples)")
-
-        # ✅ TF-IDF optimisé pour le dialecte tunisien
-        vectorizer = TfidfVectorizer(
-            ngram_range=(1, 3),              # ← 1,2,3-grams pour capturer les phrases
-            max_features=10000,              # ← Plus de features
-            lowercase=True,
-            stop_words=None,
-            token_pattern=r'\b[a-zA-Z0-9]+\b'  # ← Garde les mots avec chiffres (ex: "10.5", "bac")
-        )
-        X_vec = vectorizer.fit_transform(X)
-
-        # ✅ Modèle : Logistic Regression (meilleure calibration que RF)
-        model = LogisticRegression(
-            random_state=42,
-            class_weight="balanced",         # ← Compense les déséquilibres de classes
-            max_iter=1000,
-            C=1.0                            # ← Régularisation standard
-        )
-        model.fit(X_vec, y)
-
-        # ✅ Sauvegarde
-        MODEL_SAVE_PATH.parent.mkdir(parents=True, exist_ok=True)
-        joblib.dump({
-            "model": model,
-            "vectorizer": vectorizer,
-            "classes": sorted(list(set(y)))
-        }, MODEL_SAVE_PATH)
-
-        print(f"✅ Modèle LR entraîné avec succès !")
-        print(f"   → Échantillons : {len(X)}")
-        print(f"   → Classes : {sorted(list(set(y)))}")
-        print(f"   → N-grams : {vectorizer.ngram_range}")
-        print(f"   → Sauvegardé dans : {MODEL_SAVE_PATH}")
-
+    on_progress("chargement")
+    artifact, version = load_model(mmap_mode=None)  # tableaux modifiables pour partial_fit
+    since = _parse_id(manifest["high_water_mark"])
+    conversations, y, ids = generate_training_data(since=since)
+    if not conversations:
+        print("✅ Aucune nouvelle conversation étiquetée : modèle inchangé")
         return True
 
+    train_conversations, train_y, held_out = [], [], []
+    start = 0
+    for messages, conversation_id in zip(conversations, ids):
+        labels, start = y[start:start + len(messages)], start + len(messages)
+        if _is_held_out(conversation_id):
+            held_out.append((messages, labels[0]))
+        else:
+            train_conversations.append(messages)
+            train_y.extend(labels)
+
+    on_progress("features")
+    featurizer = PrefixTfidfFeaturizer(artifact["vectorizer"])
+    candidate = copy.deepcopy(artifact["model"])
+    if train_conversations:
+        on_progress("apprentissage")
+        candidate.partial_fit(featurizer.transform(train_conversations), train_y)
+
+    on_progress("évaluation")
+    eval_conversations, eval_y = _evaluation_set(held_out, since)
+    if eval_conversations:
+        X_eval = featurizer.transform(eval_conversations)
+        current_f1 = round(float(f1_score(eval_y, artifact["model"].predict(X_eval), average="macro")), 4)
+        candidate_f1 = round(float(f1_score(eval_y, candidate.predict(X_eval), average="macro")), 4)
+    else:
+        current_f1 = candidate_f1 = None
+    print(f"📊 F1 macro : actuel {current_f1} → candidat {candidate_f1} ({len(eval_y)} exemples)")
+
+    if current_f1 is not None and candidate_f1 < current_f1 - TRAIN_GATE_TOLERANCE:
+        # Pas de promotion sans évaluation : la version courante reste en service et le
+        # point de reprise n'avance pas (ces conversations seront réévaluées au prochain passage).
+        # Rejets consécutifs comptés dans le manifeste : au-delà de la limite, refonte complète
+        rejections = manifest.get("rejections", 0) + 1
+        if rejections >= TRAIN_MAX_REJECTIONS:
+            print(f"⚠️  Mise à jour rejetée {rejections} fois de suite → refonte complète")
+            return _full_refit(on_progress, "sgd")
+        annotate_manifest(rejections=rejections, last_rejection={
+            "current_f1": current_f1, "candidate_f1": candidate_f1, "examples": len(eval_y)})
+        print(f"⚠️  Mise à jour rejetée par l'évaluation ({rejections}/{TRAIN_MAX_REJECTIONS}) : "
+              f"version {version} conservée (refonte complète : python -m models.training_worker --full-refit)")
+        return REJECTED
+
+    on_progress("sauvegarde")
+    manifest = save_model({
+        "model": candidate,
+        "vectorizer": artifact["vectorizer"],
+        "classes": artifact["classes"]
+    }, metadata={
+        "samples": manifest.get("samples", 0) + len(train_y),
+        "mode": "incremental",
+        "estimator": "sgd",
+        "high_water_mark": str(max(ids)),
+        "updates": manifest.get("updates", 0) + 1,
+        "base_version": version,
+        "eval": {"current_f1": current_f1, "candidate_f1": candidate_f1, "examples": len(eval_y)},
+    })
+
+    print(f"✅ Modèle mis à jour avec {len(train_y)} nouveaux exemples")
+    print(f"   → Version : {manifest['version']} (mise à jour n°{manifest['updates']})")
+    return True
+
+
+def train_predictor(on_progress=_no_progress, mode=TRAIN_MODE, full_refit=False):
+    """
+    Entraîne le prédicteur de statut.
+    mode "full" : LogisticRegression + TF-IDF réappris sur tout l'historique.
+    mode "incremental" : SGDClassifier mis à jour sur les nouvelles conversations ;
+    refonte complète au premier passage, toutes les TRAIN_FULL_REFIT_EVERY mises
+    à jour, ou si `full_refit`.
+    `on_progress(étape)` est appelé au début de chaque étape (suivi par le worker).
+    Retourne True (modèle publié ou inchangé), False (erreur) ou REJECTED.
+    """
+    try:
+        if mode == "incremental":
+            manifest = read_manifest()
+            if (not full_refit and manifest
+                    and manifest.get("estimator") == "sgd"
+                    and manifest.get("high_water_mark")
+                    and manifest.get("updates", 0) < TRAIN_FULL_REFIT_EVERY):
+                return _incremental_update(on_progress, manifest)
+            return _full_refit(on_progress, "sgd")
+        return _full_refit(on_progress, "lr")
+
     except Exception as e:
         print(f"❌ Erreur lors de l'entraînement : {str(e)}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,165 @@
+# models/training_worker.py
+import argparse
+import fcntl
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from config.settings import TRAIN_NICE, TRAIN_CPUS, TRAIN_MEMORY_MB, TRAIN_TIMEOUT, TRAIN_MODE
+
+# Chemins calculés ici (même dossier que models.registry.MODEL_DIR) : importer le
+# registre chargerait numpy/scikit-learn/joblib avant apply_limits
+PROJECT_ROOT = Path(__file__).parent.parent
+MODEL_DIR = PROJECT_ROOT / "models" / "saved"
+
+# Verrou partagé par tous les workers de l'application (même machine, même dossier de modèles)
+LOCK_PATH = MODEL_DIR / ".training.lock"
+
+# Codes de sortie du worker
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_REJECTED = 3  # mise à jour incrémentale refusée par l'évaluation (version courante conservée)
+EXIT_BUSY = 75  # EX_TEMPFAIL : un autre entraînement est déjà en cours
+
+
+class TrainingLock:
+    """Verrou exclusif non bloquant (flock), libéré automatiquement si le processus meurt"""
+
+    def __init__(self, path=LOCK_PATH):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            self._file = open(self.path, "a+")
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._file.close()
+                self._file = None
+                return False
+            # Le fichier a pu être supprimé par release() entre open et flock : verrou sur un fichier orphelin
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self._file.fileno()).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            self._file.close()
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(str(os.getpid()))
+        self._file.flush()
+        return True
+
+    def release(self):
+        if self._file is not None:
+            # Suppression avant de relâcher le verrou : aucun fichier d'exécution ne reste dans models/saved
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def parse_cpus(value):
+    """ "2,3" ou "0-3" → {2, 3} / {0, 1, 2, 3} ; vide → None (tous les cœurs)"""
+    cpus = set()
+    for part in filter(None, (p.strip() for p in (value or "").split(","))):
+        start, _, end = part.partition("-")
+        cpus.update(range(int(start), int(end or start) + 1))
+    return cpus or None
+
+
+def apply_limits(nice=TRAIN_NICE, cpus=None, memory_mb=TRAIN_MEMORY_MB):
+    """Limites appliquées au processus courant (à appeler dans le processus d'entraînement)"""
+    if nice:
+        os.nice(nice)
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def run_worker(nice=TRAIN_NICE, cpus=TRAIN_CPUS, memory_mb=TRAIN_MEMORY_MB, mode=TRAIN_MODE, full_refit=False):
+    """Corps du processus d'entraînement : verrou, limites, entraînement, durée. Retourne le code de sortie."""
+    lock = TrainingLock()
+    if not lock.acquire():
+        print("⏭️  Entraînement déjà en cours dans un autre processus")
+        return EXIT_BUSY
+
+    try:
+        apply_limits(nice, parse_cpus(cpus), memory_mb)
+        # Import tardif : numpy/scikit-learn démarrent leurs pools de threads après l'affinité
+        from models.train_predictor import REJECTED, train_predictor
+
+        start = time.monotonic()
+
+        def on_progress(stage):
+            print(f"⏱️  [{time.monotonic() - start:6.1f}s] Étape : {stage}", flush=True)
+
+        success = train_predictor(on_progress=on_progress, mode=mode, full_refit=full_refit)
+        print(f"⏱️  Durée totale : {time.monotonic() - start:.1f}s", flush=True)
+        if success == REJECTED:
+            return EXIT_REJECTED
+        return EXIT_OK if success else EXIT_FAILED
+    except MemoryError:
+        print(f"❌ Plafond mémoire atteint ({memory_mb} Mo)")
+        return EXIT_FAILED
+    finally:
+        lock.release()
+
+
+def run_training_process(nice=TRAIN_NICE, cpus=TRAIN_CPUS, memory_mb=TRAIN_MEMORY_MB, timeout=TRAIN_TIMEOUT,
+                         mode=TRAIN_MODE, full_refit=False):
+    """
+    Lance l'entraînement dans un processus enfant (hors du GIL de l'application) et
+    relaie sa sortie. Le modèle produit est publié par le registre ; les workers Flask
+    le chargent via ModelWatcher. Retourne le code de sortie (EXIT_OK, EXIT_FAILED, EXIT_REJECTED, EXIT_BUSY).
+    """
+    command = [sys.executable, "-u", "-m", "models.training_worker",
+               "--nice", str(nice), "--cpus", cpus or "", "--memory-mb", str(memory_mb), "--mode", mode]
+    if full_refit:
+        command.append("--full-refit")
+    env = dict(os.environ)
+    if parse_cpus(cpus):
+        # Pas plus de threads BLAS que de cœurs autorisés
+        env.setdefault("OMP_NUM_THREADS", str(len(parse_cpus(cpus))))
+
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True)
+    watchdog = threading.Timer(timeout, process.kill)
+    watchdog.start()
+    try:
+        for line in process.stdout:
+            print(f"   [trainer {process.pid}] {line.rstrip()}")
+        returncode = process.wait()
+    finally:
+        watchdog.cancel()
+
+    if returncode < 0:
+        print(f"❌ Entraînement interrompu (signal {-returncode}, délai {timeout}s)")
+        return EXIT_FAILED
+    return returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entraîne le prédicteur de statut dans un processus dédié")
+    parser.add_argument("--nice", type=int, default=TRAIN_NICE, help="Incrément de priorité (nice)")
+    parser.add_argument("--cpus", default=TRAIN_CPUS, help='Cœurs autorisés, ex. "2,3" ou "0-1"')
+    parser.add_argument("--memory-mb", type=int, default=TRAIN_MEMORY_MB, help="Plafond mémoire (0 = aucun)")
+    parser.add_argument("--mode", choices=["full", "incremental"], default=TRAIN_MODE)
+    parser.add_argument("--full-refit", action="store_true", help="Mode incrémental : forcer une refonte complète")
+    args = parser.parse_args()
+    sys.exit(run_worker(args.nice, args.cpus, args.memory_mb, args.mode, args.full_refit))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,60 @@
 # routes/route.py
-from flask import render_template, request, jsonify, session
-from chatbot.conversation_engine import QualificationChatbot
+import json
+import uuid
+from datetime import datetime
+from flask import Response, render_template, request, jsonify, session, stream_with_context
+from chatbot.conversation_engine import QualificationChatbot, get_shared_modules
+from chatbot.knowledge_base import get_knowledge_base
+from chatbot.prefetcher import get_prefetcher
+from routes.session_store import create_session_store
 
-# Stockage simple des sessions par IP
-sessions = {}
+# Sessions bornées (LRU + expiration), backend configurable (SESSION_BACKEND)
+sessions = create_session_store()
+
+
+def _new_chatbot(raw_state=None):
+    if raw_state is not None:
+        return QualificationChatbot.from_state(raw_state)
+    return QualificationChatbot()
+
+
+def get_session_key(create_cookie=True):
+    """
+    Clé de session : identifiant du cookie de session Flask (signé),
+    l'IP ne sert que de repli pour les clients API sans cookie.
+    """
+    sid = session.get("sid")
+    if sid:
+        return sid
+    if create_cookie:
+        session["sid"] = uuid.uuid4().hex
+        return session["sid"]
+    return f"ip:{request.remote_addr}"
+
+
+def get_session(create_cookie=True):
+    key = get_session_key(create_cookie)
+    chatbot = sessions.load_or_create(key, _new_chatbot)
+    chatbot.session_id = key  # rattache les préchargements à la session (même entre workers/requêtes)
+    return key, chatbot
+
+
+def _api_payload(result):
+    """Format de réponse commun aux endpoints /api/chat*"""
+    return {
+        "success": True,
+        "data": {
+            "response": result.get("response", "Désolé, je n'ai pas compris."),
+            "score": result.get("score", 0),
+            "phase": result.get("phase", "unknown"),
+            "timestamp": datetime.now().isoformat()
+        }
+    }
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
 
-def get_session():
-    session_id = request.remote_addr
-    if session_id not in sessions:
-        sessions[session_id] = QualificationChatbot()
-    return sessions[session_id]
 
 def register_routes(app):
     @app.route("/")
@@ -18,14 +63,15 @@ def register_routes(app):
 
     @app.route("/chat", methods=["POST"])
     def chat():
-        sess = get_session()
         data = request.get_json()
         user_message = data.get("message", "").strip()
 
         if not user_message:
             return jsonify({"error": "Message vide"}), 400
 
+        key, sess = get_session()
         result = sess.process_message(user_message)
+        sessions.save(key, sess)
         return jsonify(result)
 
     # ✅ NOUVELLE : API Endpoint (version publique)
@@ -49,21 +95,34 @@ def register_routes(app):
             return jsonify({"error": "Message vide"}), 400
 
         try:
-            sess = get_session()
+            key, sess = get_session(create_cookie=False)
             result = sess.process_message(user_message)
+            sessions.save(key, sess)
 
             # Format API clair
-            api_response = {
-                "success": True,
-                "data": {
-                    "response": result.get("response", "Désolé, je n'ai pas compris."),
-                    "score": result.get("score", 0),
-                    "phase": result.get("phase", "unknown"),
-                    "timestamp": datetime.now().isoformat()
-                }
-            }
-            return jsonify(api_response)
+            return jsonify(_api_payload(result))
+
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "error": "Erreur interne du serveur",
+                "details": str(e) if app.debug else None
+            }), 500
 
+    # ⚡ Variante asynchrone (httpx, connexions partagées). Sous un serveur WSGI, Flask
+    #    exécute chaque vue async dans le thread de la requête : ce thread reste occupé
+    #    pendant l'attente de Gemini (pas plus de conversations simultanées que /api/chat)
+    @app.route("/api/chat/async", methods=["POST"])
+    async def api_chat_async():
+        data = request.get_json()
+        if not data or not data.get("message", "").strip():
+            return jsonify({"error": "Champ 'message' requis"}), 400
+
+        try:
+            key, sess = get_session(create_cookie=False)
+            result = await sess.aprocess_message(data["message"].strip())
+            sessions.save(key, sess)
+            return jsonify(_api_payload(result))
         except Exception as e:
             return jsonify({
                 "success": False,
@@ -71,11 +130,47 @@ def register_routes(app):
                 "details": str(e) if app.debug else None
             }), 500
 
+    # 🌊 Réponse en flux (server-sent events) : meta dès la fin de la recherche,
+    #    puis le texte reformulé morceau par morceau
+    @app.route("/api/chat/stream", methods=["POST"])
+    def api_chat_stream():
+        data = request.get_json()
+        if not data or not data.get("message", "").strip():
+            return jsonify({"error": "Champ 'message' requis"}), 400
+
+        user_message = data["message"].strip()
+        key, sess = get_session(create_cookie=False)
+
+        def events():
+            try:
+                for event, payload in sess.stream_message(user_message):
+                    if event == "done":
+                        payload = _api_payload(payload)
+                    yield _sse(event, payload)
+            except Exception as e:
+                yield _sse("error", {"success": False, "error": "Erreur interne du serveur",
+                                     "details": str(e) if app.debug else None})
+            finally:
+                sessions.save(key, sess)
+
+        return Response(
+            stream_with_context(events()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
     @app.route("/api/status")
     def api_status():
         """Vérifie si l'API est en marche"""
+        gemini, retriever, _ = get_shared_modules()
         return jsonify({
             "status": "running",
             "service": "RaGlobal Chatbot API",
-            "version": "1.0"
+            "version": "1.0",
+            "knowledge_base": get_knowledge_base().stats(),
+            "sessions": sessions.stats(),
+            "gemini_cache": gemini.cache.stats() if gemini.cache else None,
+            "gemini_http": gemini.http.stats(),
+            "retrieval_fallback": retriever.fallback_stats.stats(),
+            "prefetch": get_prefetcher().stats() if get_prefetcher() else None
         })
\ No newline at end of file
@@ -0,0 +1,203 @@
+# routes/session_store.py
+import threading
+import time
+from collections import OrderedDict
+
+from config.settings import (
+    SESSION_BACKEND, SESSION_MAX_SESSIONS, SESSION_IDLE_TTL,
+    SESSION_COLLECTION_NAME, REDIS_URL
+)
+
+
+class SessionStore:
+    """
+    Interface commune : load_or_create(clé, fabrique) avant de traiter un message,
+    save(clé, chatbot) après. Compteurs : sessions vivantes, évictions, octets/session.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+        self._sizes = {}  # clé → taille de l'état sérialisé (octets), backends sérialisés
+
+    def load_or_create(self, key, factory):
+        raise NotImplementedError
+
+    @staticmethod
+    def _release(chatbot):
+        # Session évincée : ses préchargements en cours n'ont plus de destinataire
+        chatbot.release()
+
+    def save(self, key, chatbot):
+        raise NotImplementedError
+
+    def live_sessions(self):
+        raise NotImplementedError
+
+    def _session_sizes(self):
+        with self._lock:
+            return list(self._sizes.values())
+
+    def stats(self):
+        sizes = self._session_sizes()
+        return {
+            "backend": self.backend_name,
+            "live_sessions": self.live_sessions(),
+            "created": self.created,
+            "evicted_lru": self.evicted_lru,
+            "evicted_ttl": self.evicted_ttl,
+            "avg_bytes_per_session": int(sum(sizes) / len(sizes)) if sizes else 0,
+        }
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions gardées en mémoire du processus : LRU borné + expiration après inactivité"""
+    backend_name = "memory"
+    SIZE_SAMPLE = 100  # sessions sérialisées à la lecture des stats (les plus récentes)
+
+    def __init__(self, max_sessions=SESSION_MAX_SESSIONS, idle_ttl=SESSION_IDLE_TTL):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()  # clé → (chatbot, dernier accès), du plus ancien au plus récent
+
+    def _purge_expired(self, now):
+        # Ordre LRU : les sessions expirées sont en tête
+        while self._sessions:
+            _, last_seen = next(iter(self._sessions.values()))
+            if now - last_seen < self.idle_ttl:
+                break
+            chatbot, _ = self._sessions.popitem(last=False)[1]
+            self.evicted_ttl += 1
+            self._release(chatbot)
+
+    def load_or_create(self, key, factory):
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._sessions.pop(key, None)
+            if entry is not None:
+                self._sessions[key] = (entry[0], now)
+                return entry[0]
+
+        # Création hors verrou (peut être lente la première fois)
+        chatbot = factory()
+        with self._lock:
+            if key in self._sessions:
+                chatbot = self._sessions.pop(key)[0]
+            else:
+                self.created += 1
+            self._sessions[key] = (chatbot, now)
+            while len(self._sessions) > self.max_sessions:
+                _, (old_chatbot, _) = self._sessions.popitem(last=False)
+                self.evicted_lru += 1
+                self._release(old_chatbot)
+        return chatbot
+
+    def save(self, key, chatbot):
+        # La session est déjà en mémoire : rien à sérialiser à chaque message
+        pass
+
+    def _session_sizes(self):
+        # Taille calculée à la lecture des stats, sur un échantillon des sessions récentes
+        with self._lock:
+            recent = [chatbot for chatbot, _ in reversed(self._sessions.values())][:self.SIZE_SAMPLE]
+        return [len(chatbot.export_state()) for chatbot in recent]
+
+    def live_sessions(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SerializedSessionStore(SessionStore):
+    """
+    Sessions sérialisées dans un backend partagé (Redis, MongoDB) : chaque requête
+    recharge l'état, plusieurs workers peuvent donc servir la même conversation.
+    """
+    backend_name = "serialized"
+
+    def __init__(self, idle_ttl=SESSION_IDLE_TTL):
+        super().__init__()
+        self.idle_ttl = idle_ttl
+
+    def _get_bytes(self, key):
+        raise NotImplementedError
+
+    def _put_bytes(self, key, raw):
+        raise NotImplementedError
+
+    def load_or_create(self, key, factory):
+        raw = self._get_bytes(key)
+        if raw is not None:
+            return factory(raw)
+        with self._lock:
+            self.created += 1
+        return factory()
+
+    def save(self, key, chatbot):
+        raw = chatbot.export_state()
+        self._put_bytes(key, raw)
+        with self._lock:
+            self._sizes[key] = len(raw)
+            # Les expirations sont gérées par le backend : on borne juste les compteurs
+            while len(self._sizes) > SESSION_MAX_SESSIONS:
+                self._sizes.pop(next(iter(self._sizes)))
+
+
+class RedisSessionStore(SerializedSessionStore):
+    """Backend Redis (ou tout serveur compatible) : expiration native via SETEX"""
+    backend_name = "redis"
+
+    def __init__(self, url=REDIS_URL, idle_ttl=SESSION_IDLE_TTL, prefix="raglobal:session:"):
+        super().__init__(idle_ttl=idle_ttl)
+        import redis  # dépendance optionnelle
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _get_bytes(self, key):
+        return self.client.get(self.prefix + key)
+
+    def _put_bytes(self, key, raw):
+        self.client.setex(self.prefix + key, self.idle_ttl, raw)
+
+    def live_sessions(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*", count=1000))
+
+
+class MongoSessionStore(SerializedSessionStore):
+    """Backend MongoDB : une collection dédiée avec index TTL sur updated_at"""
+    backend_name = "mongo"
+
+    def __init__(self, collection=None, idle_ttl=SESSION_IDLE_TTL):
+        super().__init__(idle_ttl=idle_ttl)
+        if collection is None:
+            from database.mongo_client import db
+            collection = db[SESSION_COLLECTION_NAME]
+        self.collection = collection
+        self.collection.create_index("updated_at", expireAfterSeconds=idle_ttl)
+
+    def _get_bytes(self, key):
+        doc = self.collection.find_one({"_id": key}, {"state": 1})
+        return bytes(doc["state"]) if doc else None
+
+    def _put_bytes(self, key, raw):
+        from datetime import datetime, timezone
+        self.collection.update_one(
+            {"_id": key},
+            {"$set": {"state": raw, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+    def live_sessions(self):
+        return self.collection.estimated_document_count()
+
+
+def create_session_store(backend=SESSION_BACKEND):
+    """Instancie le store configuré (SESSION_BACKEND), mémoire par défaut"""
+    if backend == "redis":
+        return RedisSessionStore()
+    if backend == "mongo":
+        return MongoSessionStore()
+    return MemorySessionStore()
@@ -1,7 +1,8 @@
 # scripts/auto_train_monitor.py
 import time
 import threading
-from models.train_predictor import train_predictor
+from models.training_worker import EXIT_BUSY, EXIT_OK, EXIT_REJECTED, run_training_process
+from chatbot.knowledge_base import reload_knowledge_base
 from database.mongo_client import leads_collection
 
 # Configuration
@@ -26,13 +27,22 @@ def monitor_loop():
 
             if new_count >= MIN_NEW_CONVERSATIONS:
                 print(f"\n🆕 {new_count} nouvelles conversations détectées !")
-                print("🔄 Démarrage du ré-entraînement...")
+                print("🔄 Démarrage du ré-entraînement (processus séparé)...")
 
-                success = train_predictor()
+                status = run_training_process()
 
-                if success:
+                if status == EXIT_BUSY:
+                    # Un autre worker entraîne déjà : son modèle arrivera via ModelWatcher
                     last_count = current_count
+                elif status == EXIT_OK:
+                    last_count = current_count
+                    # Bascule immédiate dans ce processus (les autres workers la voient via ModelWatcher)
+                    reload_knowledge_base()
                     print(f"✅ Entraînement terminé. Prochaine vérification dans {CHECK_INTERVAL}s.")
+                elif status == EXIT_REJECTED:
+                    # Modèle inchangé : nouvel essai seulement quand d'autres conversations arrivent
+                    last_count = current_count
+                    print("⚠️  Mise à jour rejetée par l'évaluation : modèle courant conservé.")
                 else:
                     print("⚠️  Échec de l'entraînement. Nouvelle tentative dans 1 minute.")
             else:
@@ -0,0 +1,57 @@
+# scripts/bench_clean_text.py
+import json
+import re
+import timeit
+from pathlib import Path
+
+from chatbot.normalization import NORMALIZATION_MAP, clean_text
+
+# Chemins
+PROJECT_ROOT = Path(__file__).parent.parent
+DATA_PATH = PROJECT_ROOT / "data" / "cleaned_synthetic_conversations.json"
+
+
+def clean_text_reference(text):
+    """Ancienne implémentation : un re.sub par motif de NORMALIZATION_MAP"""
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    for pattern, replacement in NORMALIZATION_MAP.items():
+        text = re.sub(pattern, replacement, text)
+    text = re.sub(r"[^\w\s]", "", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def load_corpus():
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        conversations = json.load(f)
+    texts = []
+    for conv in conversations:
+        texts.extend(msg.get("text", "") for msg in conv.get("messages", []))
+        texts.append(conv.get("summary", ""))
+    return texts
+
+
+def check_golden(texts):
+    """Vérifie que le normaliseur compilé reproduit exactement l'ancienne sortie"""
+    mismatches = [t for t in texts if clean_text(t) != clean_text_reference(t)]
+    if mismatches:
+        print(f"❌ {len(mismatches)} textes diffèrent de la référence, ex : {mismatches[0]!r}")
+        return False
+    print(f"✅ Sortie identique sur les {len(texts)} textes du corpus")
+    return True
+
+
+def benchmark(texts, repeat=5):
+    """Coût moyen par message (meilleur de `repeat` passes sur tout le corpus)"""
+    for name, fn in [("référence (re.sub en boucle)", clean_text_reference),
+                     ("DialectNormalizer (1 passe)", clean_text)]:
+        best = min(timeit.repeat(lambda: [fn(t) for t in texts], number=1, repeat=repeat))
+        print(f"⏱️  {name:<30} {best / len(texts) * 1e6:8.2f} µs/message")
+
+
+if __name__ == "__main__":
+    corpus = load_corpus()
+    if check_golden(corpus):
+        benchmark(corpus)
@@ -0,0 +1,107 @@
+# scripts/bench_keyword_scorer.py
+import json
+import timeit
+from collections import Counter
+from pathlib import Path
+
+from models.scoring_system import compile_matchers
+
+# Chemins
+PROJECT_ROOT = Path(__file__).parent.parent
+DATA_PATH = PROJECT_ROOT / "data" / "cleaned_synthetic_conversations.json"
+QUESTIONS_PATH = PROJECT_ROOT / "chatbot" / "questions.json"
+
+# Réponses où l'ancienne recherche par sous-chaîne se trompait
+KNOWN_CASES = [
+    (1, "15.5, bac économie gestion.", 5),  # "no" dans "économie" → 0 auparavant
+    (1, "Ok, nchallah nalkaa 7all.", 5),    # "la" dans "nchallah" → 0 auparavant
+    (1, "Fhemtek. Merci al tawdhih.", 5),   # "ih" dans "tawdhih" → 10 auparavant
+    (4, "le najem", 0),                     # négation d'un mot-clé positif non listée
+    (2, "jibt 16.5", 10),                   # nombre décimal = un token
+    (1, "le 3andi bac", 0),                 # mot-clé explicite le plus long
+]
+
+
+def calculate_score_answer_reference(question_data, user_answer):
+    """Ancienne implémentation : sous-chaîne, premier mot-clé dans l'ordre du dict"""
+    user_answer = user_answer.lower()
+    for keyword, score in question_data["keywords"].items():
+        if keyword in user_answer:
+            return score
+    return question_data.get("default_score", 0)
+
+
+def load_answers():
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        conversations = json.load(f)
+    return [
+        msg["text"] for conv in conversations for msg in conv.get("messages", [])
+        if msg.get("sender_type") == "contact" and msg.get("text")
+    ]
+
+
+def check_known_cases(questions, matchers):
+    ok = True
+    for question_id, answer, expected in KNOWN_CASES:
+        index = next(i for i, q in enumerate(questions) if q["id"] == question_id)
+        match = matchers[index].best_match(answer)
+        score = match.score if match else matchers[index].default_score
+        old = calculate_score_answer_reference(questions[index], answer)
+        status = "✅" if score == expected else "❌"
+        ok &= score == expected
+        span = answer[match.span[0]:match.span[1]] if match else None
+        print(f"{status} Q{question_id} {answer!r:<32} → {score} (avant {old}), retenu : {span!r}")
+    return ok
+
+
+def compare(questions, matchers, answers):
+    """Répartition des écarts de score entre l'ancienne et la nouvelle règle"""
+    changes = Counter()
+    for question, matcher in zip(questions, matchers):
+        for answer in answers:
+            changes[(calculate_score_answer_reference(question, answer), matcher.score(answer))] += 1
+    total = sum(changes.values())
+    same = sum(count for (old, new), count in changes.items() if old == new)
+    print(f"\n📊 {same}/{total} scores identiques ({same / total:.1%})")
+    for (old, new), count in changes.most_common():
+        if old != new:
+            print(f"   {old:>2} → {new:>2} : {count}")
+
+
+def benchmark(questions, matchers, answers, repeat=5):
+    """Coût moyen par réponse notée (meilleur de `repeat` passes, toutes questions)"""
+    runs = [
+        ("référence (sous-chaînes)", lambda: [calculate_score_answer_reference(q, a)
+                                              for q in questions for a in answers]),
+        ("trie de tokens (compilé)", lambda: [m.score(a) for m in matchers for a in answers]),
+    ]
+    count = len(questions) * len(answers)
+    print()
+    for name, run in runs:
+        best = min(timeit.repeat(run, number=1, repeat=repeat))
+        print(f"⏱️  {name:<26} {best / count * 1e6:8.2f} µs/réponse")
+
+    start = timeit.default_timer()
+    compile_matchers(questions)
+    print(f"⏱️  compilation des {len(questions)} matchers : {(timeit.default_timer() - start) * 1e3:.2f} ms")
+
+    # Le coût de la référence croît avec le nombre de mots-clés, pas celui du trie
+    sample = answers[:500]
+    for size in (25, 250, 2500):
+        question = {"keywords": {f"kw{i} x{i % 7}": i % 11 for i in range(size)}, "default_score": 5}
+        matcher = compile_matchers([question])[0]
+        old = min(timeit.repeat(lambda: [calculate_score_answer_reference(question, a) for a in sample],
+                                number=1, repeat=repeat))
+        new = min(timeit.repeat(lambda: [matcher.score(a) for a in sample], number=1, repeat=repeat))
+        print(f"⏱️  {size:>5} mots-clés : référence {old / len(sample) * 1e6:8.2f} µs"
+              f" / trie {new / len(sample) * 1e6:6.2f} µs par réponse")
+
+
+if __name__ == "__main__":
+    with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
+        questions = json.load(f)["questions"]
+    matchers = compile_matchers(questions)
+    answers = load_answers()
+    check_known_cases(questions, matchers)
+    compare(questions, matchers, answers)
+    benchmark(questions, matchers, answers)
@@ -0,0 +1,84 @@
+# scripts/build_rephrasing_bank.py
+import argparse
+import json
+import os
+from datetime import datetime
+
+from chatbot.conversation_engine import _rephrase_prompt
+from chatbot.gemini_assistant import SYSTEM_INSTRUCTION, GeminiAssistant
+from chatbot.rephrasing_bank import BANK_VERSION, QUESTIONS_PATH, questions_hash
+from config.settings import REPHRASING_BANK_PATH
+
+# Textes fixes de questions.json à reformuler, en plus des questions
+FINAL_MESSAGE_FIELDS = ["final_qualified_tn", "final_followup_tn", "final_not_qualified_tn"]
+
+
+def collect_texts(questions_file=QUESTIONS_PATH):
+    with open(questions_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    texts = [q["text_tn"] for q in data["questions"]]
+    texts += [data[field] for field in FINAL_MESSAGE_FIELDS if data.get(field)]
+    return texts
+
+
+def build_bank(k, output=REPHRASING_BANK_PATH):
+    gemini = GeminiAssistant(cache=False)
+    texts = collect_texts()
+    bank = {}
+    failed = []
+
+    for i, text in enumerate(texts, 1):
+        variants = []
+        # Quelques essais de plus que k : les doublons et les échecs sont ignorés
+        for _ in range(k * 2):
+            if len(variants) >= k:
+                break
+            try:
+                # Même prompt et mêmes instructions que la génération en direct (sans cache)
+                variant = gemini._request(_rephrase_prompt(text), SYSTEM_INSTRUCTION)
+            except Exception as e:
+                print(f"   ⚠️  Échec de génération : {e}")
+                continue
+            if variant and variant not in variants:
+                variants.append(variant)
+        if not variants:
+            # Absent de la banque : le moteur reformulera ce texte en direct
+            failed.append(text)
+            print(f"❌ [{i}/{len(texts)}] aucune variante : {text[:50]}")
+            continue
+        bank[text] = variants
+        print(f"✅ [{i}/{len(texts)}] {len(variants)} variantes : {text[:50]}")
+
+    data = {
+        "version": BANK_VERSION,
+        "questions_hash": questions_hash(),
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "variants_per_text": k,
+        "texts": bank,
+    }
+    # Écriture atomique : les workers ne lisent jamais un fichier à moitié écrit
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output)
+    print(f"\n💾 Banque sauvegardée dans : {output}")
+    if failed:
+        print(f"⚠️  {len(failed)}/{len(texts)} textes sans variante (génération en direct) :")
+        for text in failed:
+            print(f"   - {text}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-génère les reformulations des questions de qualification")
+    parser.add_argument("-k", type=int, default=5, help="Nombre de reformulations par texte")
+    parser.add_argument("--output", default=str(REPHRASING_BANK_PATH))
+    args = parser.parse_args()
+
+    print(f"🚀 Génération de {args.k} reformulations par texte")
+    if build_bank(args.k, args.output):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# scripts/eval_dense_retrieval.py
+import argparse
+import json
+import random
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+
+from chatbot.dense_index import DenseIndex, hnswlib, top_k
+from chatbot.knowledge_base import build_snapshot, extract_pairs
+from chatbot.normalization import clean_text
+from chatbot.response_retriever import ResponseRetriever
+from config.settings import DENSE_SIMILARITY_THRESHOLD, LSA_COMPONENTS
+
+# Chemins
+PROJECT_ROOT = Path(__file__).parent.parent
+DATA_PATH = PROJECT_ROOT / "data" / "cleaned_synthetic_conversations.json"
+
+
+def split_pairs(path=DATA_PATH, holdout=0.2, seed=42):
+    """Paires Q/R de la base (80 %) et questions jamais vues servant de requêtes (20 %)"""
+    with open(path, "r", encoding="utf-8") as f:
+        conversations = json.load(f)
+    random.Random(seed).shuffle(conversations)
+    cut = int(len(conversations) * (1 - holdout))
+    base = [pair for conv in conversations[:cut] for pair in extract_pairs(conv)]
+    queries = [pair["question"] for conv in conversations[cut:] for pair in extract_pairs(conv)]
+    return base, queries
+
+
+def percentiles(seconds):
+    ms = np.asarray(seconds) * 1e3
+    return f"p50 {np.percentile(ms, 50):6.3f} ms  p95 {np.percentile(ms, 95):6.3f} ms"
+
+
+def time_queries(search, queries):
+    """Latence par requête (une requête à la fois, comme en production)"""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def recall_at_k(approx, exact, k):
+    hits = [len(set(a[:k]) & set(e[:k])) / min(k, len(e)) for a, e in zip(approx, exact) if len(e)]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare la recherche TF-IDF et la recherche dense LSA + ANN")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--components", type=int, default=LSA_COMPONENTS)
+    args = parser.parse_args()
+
+    base, raw_queries = split_pairs()
+    snapshot = build_snapshot(conversations=tuple(base))
+    if not snapshot.is_loaded:
+        raise SystemExit("❌ Modèle introuvable : lancer d'abord python scripts/train_model.py")
+    retriever = ResponseRetriever(gemini_assistant=object(), snapshot=snapshot)
+
+    cleaned = [clean_text(q) for q in raw_queries]
+    query_vecs, empty = retriever._query_vectors(snapshot, [c or " " for c in cleaned])
+    keep = ~empty
+    print(f"📚 {len(base)} paires indexées, {int(keep.sum())}/{len(raw_queries)} requêtes avec un terme connu")
+
+    start = time.perf_counter()
+    dense = DenseIndex.build(snapshot.question_vectors, backend="exact", n_components=args.components)
+    print(f"🧮 LSA {dense.encoder.dimensions} dimensions : {time.perf_counter() - start:.2f}s, "
+          f"{dense.embeddings.nbytes / 1024:.0f} Ko de vecteurs float32")
+    embeddings = dense.encode(query_vecs[keep])
+    sparse_queries = query_vecs[keep]
+
+    # Référence : recherche dense exhaustive
+    exact = [indices for indices, _ in dense.search(embeddings, args.k)]
+    backends = ["ivf"] + (["hnsw"] if hnswlib is not None else [])
+    indexes = {"exact": dense}
+    for backend in backends:
+        start = time.perf_counter()
+        indexes[backend] = dense.with_backend(backend)
+        print(f"🏗️  index {backend} : {time.perf_counter() - start:.2f}s")
+    if hnswlib is None:
+        print("ℹ️  hnswlib non installé : HNSW non mesuré")
+
+    print(f"\n🎯 Rappel par rapport à la recherche dense exacte")
+    for backend in backends:
+        approx = [indices for indices, _ in indexes[backend].search(embeddings, args.k)]
+        print(f"   {backend:<5} " + "  ".join(
+            f"recall@{k} {recall_at_k(approx, exact, k):.3f}" for k in (1, 5, args.k)))
+
+    print(f"\n⏱️  Latence par requête (k={args.k}, projection comprise pour le dense)")
+    sparse_latency = time_queries(
+        lambda i: top_k((sparse_queries[i] @ snapshot.question_vectors.T).toarray()[0], args.k),
+        range(sparse_queries.shape[0]))
+    print(f"   {'tf-idf exact':<14} {percentiles(sparse_latency)}")
+    for name, index in indexes.items():
+        latency = time_queries(lambda i: index.search(index.encode(sparse_queries[i]), args.k),
+                               range(sparse_queries.shape[0]))
+        print(f"   {'lsa ' + name:<14} {percentiles(latency)}")
+
+    # Part des requêtes qui resteraient sous le seuil (→ fallback Gemini)
+    print(f"\n🚨 Requêtes sous le seuil de similarité (fallback)")
+    sparse_best = (sparse_queries @ snapshot.question_vectors.T).max(axis=1).toarray().ravel()
+    dense_best = np.array([scores[0] for _, scores in dense.search(embeddings, 1)])
+    total, sparse_threshold = len(raw_queries), retriever.similarity_threshold(snapshot)
+    sparse_miss = int((sparse_best < sparse_threshold).sum() + empty.sum())
+    dense_miss = int((dense_best < DENSE_SIMILARITY_THRESHOLD).sum() + empty.sum())
+    print(f"   tf-idf (seuil {sparse_threshold})  : {sparse_miss}/{total} ({sparse_miss / total:.1%})")
+    print(f"   lsa    (seuil {DENSE_SIMILARITY_THRESHOLD})   : {dense_miss}/{total} ({dense_miss / total:.1%})")
+
+    # Exemples où les deux recherches divergent
+    dense_snapshot = replace(snapshot, dense_index=indexes[backends[-1]])
+    dense_retriever = ResponseRetriever(gemini_assistant=object(), snapshot=dense_snapshot)
+    shown = 0
+    print("\n🔎 Exemples (requête → question retenue)")
+    for query in raw_queries:
+        sparse_top, dense_top = retriever.find_candidates(query, 1), dense_retriever.find_candidates(query, 1)
+        if sparse_top and dense_top and sparse_top[0][0] is not dense_top[0][0] and sparse_top[0][1] < sparse_threshold:
+            print(f"   {query!r}\n      tf-idf {sparse_top[0][1]:.2f} {sparse_top[0][0]['question']!r}"
+                  f"\n      lsa    {dense_top[0][1]:.2f} {dense_top[0][0]['question']!r}")
+            shown += 1
+            if shown == 3:
+                break
+
+
+if __name__ == "__main__":
+    main()
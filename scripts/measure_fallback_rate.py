@@ -0,0 +1,171 @@
+# scripts/measure_fallback_rate.py
+import argparse
+import json
+import random
+from collections import Counter
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from chatbot.knowledge_base import build_snapshot, extract_pairs
+from chatbot.response_retriever import ResponseRetriever
+from models.retrieval_vectorizer import fit_retrieval_vectorizer
+
+# Chemins
+PROJECT_ROOT = Path(__file__).parent.parent
+DATA_PATH = PROJECT_ROOT / "data" / "cleaned_synthetic_conversations.json"
+
+TIERS = ("base", "mot-clé", "gemini", "sans terme connu")
+
+
+class CountingGemini:
+    """Remplace Gemini : compte les appels du 3e niveau de find_response"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_response(self, prompt, **kwargs):
+        self.calls += 1
+        return None
+
+
+def split_pairs(path=DATA_PATH, holdout=0.2, seed=42):
+    """Paires de la base (80 % des conversations) et paires jamais vues (20 %)"""
+    with open(path, "r", encoding="utf-8") as f:
+        conversations = json.load(f)
+    random.Random(seed).shuffle(conversations)
+    cut = int(len(conversations) * (1 - holdout))
+    base = [pair for conv in conversations[:cut] for pair in extract_pairs(conv)]
+    held_out = [pair for conv in conversations[cut:] for pair in extract_pairs(conv)]
+    return base, held_out
+
+
+def answer_similarity(answers):
+    """Cosinus TF-IDF (mots) entre deux réponses : indépendant des deux vectoriseurs comparés"""
+    vectorizer = TfidfVectorizer().fit(answers)
+
+    def similarity(a, b):
+        vectors = normalize(vectorizer.transform([a, b]))
+        return float((vectors[0] @ vectors[1].T).toarray()[0, 0])
+    return similarity
+
+
+def measure(snapshot, held_out, similarity, threshold=None):
+    """
+    Passe chaque question jamais vue par find_response et compte le niveau atteint.
+    Pour les réponses de la base (niveau 1), mesure leur proximité avec la vraie réponse.
+    """
+    gemini = CountingGemini()
+    retriever = ResponseRetriever(gemini_assistant=gemini, snapshot=snapshot)
+    if threshold is not None:
+        retriever.similarity_threshold = lambda _: threshold
+    threshold = retriever.similarity_threshold(snapshot)
+
+    tiers, quality = Counter(), []
+    for pair in held_out:
+        calls = gemini.calls
+        answer = retriever.find_response(pair["question"])
+        if gemini.calls > calls:
+            tiers["gemini"] += 1
+        elif answer is None:
+            tiers["sans terme connu"] += 1
+        else:
+            top = retriever.find_candidates(pair["question"], 1)
+            if top and top[0][1] >= threshold:
+                tiers["base"] += 1
+                quality.append(similarity(answer, pair["answer"]))
+            else:
+                tiers["mot-clé"] += 1
+    return tiers, float(np.mean(quality)) if quality else 0.0
+
+
+def band_quality(snapshot, held_out, similarity, width=0.05):
+    """
+    Proximité moyenne avec la vraie réponse de la meilleure réponse de la base, par
+    tranche de similarité de la question : {borne basse: (questions, proximité)}
+    """
+    retriever = ResponseRetriever(gemini_assistant=CountingGemini(), snapshot=snapshot)
+    bands = {}
+    for pair in held_out:
+        top = retriever.find_candidates(pair["question"], 1)
+        if top:
+            (candidate, score), = top
+            lower = round(np.floor(score / width) * width, 2)
+            bands.setdefault(lower, []).append(similarity(candidate["answer"], pair["answer"]))
+    return {lower: (len(values), float(np.mean(values))) for lower, values in sorted(bands.items())}
+
+
+def suggest_threshold(bands, floor):
+    """Plus petit seuil à partir duquel aucune tranche n'a de réponses moins proches que `floor`"""
+    suggested = None
+    for lower in sorted(bands, reverse=True):
+        if bands[lower][1] < floor:
+            break
+        suggested = lower
+    return suggested
+
+
+def report(name, threshold, tiers, quality, total):
+    shares = "  ".join(f"{tier} {tiers[tier] / total:6.1%}" for tier in TIERS)
+    print(f"   {name:<22} seuil {threshold:<5} {shares}  | proximité réponse {quality:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Part des find_response qui atteignent le fallback Gemini, par vectoriseur de recherche")
+    parser.add_argument("--thresholds", default="0.25,0.3,0.35,0.4,0.5",
+                        help="Seuils testés pour le vectoriseur de caractères")
+    args = parser.parse_args()
+
+    base, held_out = split_pairs()
+    snapshot = build_snapshot(conversations=tuple(base))
+    if not snapshot.is_loaded:
+        raise SystemExit("❌ Modèle introuvable : lancer d'abord python scripts/train_model.py")
+    similarity = answer_similarity([p["answer"] for p in base + held_out])
+    total = len(held_out)
+    print(f"📚 {len(base)} paires indexées (80 %), {total} questions jamais vues (20 %)\n")
+
+    # Avant : vectoriseur du modèle de statut (ajusté sur tout le jeu, requêtes comprises)
+    word = replace(snapshot, retrieval_vectorizer=None, retrieval_version=None, dense_index=None,
+                   question_vectors=normalize(snapshot.vectorizer.transform(snapshot.cleaned_questions).tocsr()))
+    word_retriever = ResponseRetriever(gemini_assistant=CountingGemini(), snapshot=word)
+    tiers, quality = measure(word, held_out, similarity)
+    report("mots (modèle statut)", word_retriever.similarity_threshold(word), tiers, quality, total)
+    baseline = tiers["gemini"], tiers["gemini"] + tiers["sans terme connu"]
+
+    # Après : vectoriseur de recherche dédié, ajusté sur les seules questions de la base
+    retrieval_vectorizer = fit_retrieval_vectorizer(snapshot.cleaned_questions)
+    char = replace(snapshot, retrieval_vectorizer=retrieval_vectorizer, retrieval_version="eval", dense_index=None,
+                   question_vectors=normalize(retrieval_vectorizer.transform(snapshot.cleaned_questions).tocsr()))
+    configured = ResponseRetriever(gemini_assistant=CountingGemini(), snapshot=char).similarity_threshold(char)
+    for threshold in sorted({float(t) for t in args.thresholds.split(",")} | {configured}):
+        tiers, quality = measure(char, held_out, similarity, threshold)
+        marker = " ← configuré" if threshold == configured else ""
+        report(f"char_wb {retrieval_vectorizer.ngram_range}{marker}", threshold, tiers, quality, total)
+        if threshold == configured:
+            after = tiers["gemini"], tiers["gemini"] + tiers["sans terme connu"]
+
+    print(f"\n🚨 Appels Gemini : {baseline[0]} → {after[0]} ; "
+          f"sans réponse de la base (Gemini ou aucun terme connu) : "
+          f"{baseline[1] / total:.1%} → {after[1] / total:.1%}")
+
+    # Seuil tiré de la qualité des réponses : les réponses acceptées juste au-dessus du
+    # seuil ne doivent pas être moins proches que celles de l'ancien vectoriseur à sa marge
+    word_threshold = word_retriever.similarity_threshold(word)
+    word_bands = band_quality(word, held_out, similarity)
+    margin = [(n, q) for lower, (n, q) in word_bands.items() if word_threshold <= lower < word_threshold + 0.1]
+    floor = sum(n * q for n, q in margin) / sum(n for n, _ in margin)
+    char_bands = band_quality(char, held_out, similarity)
+    print(f"\n📏 Proximité réponse par tranche de similarité (char_wb) ; "
+          f"marge de l'ancien vectoriseur [{word_threshold}, {word_threshold + 0.1:.2f}) : {floor:.3f}")
+    for lower, (n, quality) in char_bands.items():
+        flag = "" if quality >= floor else "  ← sous la marge"
+        print(f"   [{lower:.2f}, {lower + 0.05:.2f})  {n:4d} questions  proximité {quality:.3f}{flag}")
+    print(f"   → seuil suggéré : {suggest_threshold(char_bands, floor)} (configuré : {configured})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# scripts/measure_prefetch.py
+import argparse
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+import chatbot.conversation_engine as engine
+from chatbot.conversation_engine import QualificationChatbot
+from chatbot.prefetcher import Prefetcher
+
+
+class SlowGemini:
+    """Remplace Gemini : latence simulée, compte les appels"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_response(self, prompt, context="", **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return f"[reformulé] {prompt}"
+
+
+def run_session(bot, think_time, abandon_after, latencies):
+    """Salutation, demande de bourse, puis réponses aux questions (temps de réflexion entre deux messages)"""
+    messages = ["Salam", "n7eb bourse"] + ["ey"] * len(bot.questions)
+    for turn, message in enumerate(messages):
+        if abandon_after is not None and turn == abandon_after:
+            bot.release()  # session abandonnée (évincée du store)
+            return
+        start = time.perf_counter()
+        result = bot.process_message(message)
+        if result["phase"] == "qualification" and turn >= 2:
+            latencies.append(time.perf_counter() - start)
+        time.sleep(think_time * random.uniform(0.5, 1.5))
+
+
+def measure(args, prefetcher):
+    gemini = SlowGemini(args.latency)
+    latencies = []
+    threads = []
+    for i in range(args.sessions):
+        bot = QualificationChatbot(gemini=gemini, retriever=object(),
+                                   predictor=SimpleNamespace(is_loaded=False))
+        bot.prefetcher = prefetcher  # None : préchargement désactivé
+        abandon_after = random.randint(3, 8) if random.random() < args.abandon else None
+        threads.append(threading.Thread(target=run_session, args=(bot, args.think, abandon_after, latencies)))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, gemini.calls, time.perf_counter() - start
+
+
+def report(name, latencies, calls):
+    ms = np.asarray(latencies) * 1e3
+    print(f"   {name:<16} p50 {np.percentile(ms, 50):7.1f} ms  p95 {np.percentile(ms, 95):7.1f} ms  "
+          f"| {len(latencies)} questions, {calls} appels Gemini")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Latence des questions de qualification avec et sans préchargement de la reformulation")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.4, help="Latence simulée d'un appel Gemini (s)")
+    parser.add_argument("--think", type=float, default=0.6, help="Temps de réponse moyen du client (s)")
+    parser.add_argument("--abandon", type=float, default=0.2, help="Part des sessions abandonnées en cours")
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    args = parser.parse_args()
+
+    # Reformulation en direct : la banque de reformulations rendrait les deux mesures identiques
+    engine.REPHRASING_MODE = "live"
+    print(f"⏱️  {args.sessions} sessions simultanées, Gemini {args.latency * 1000:.0f} ms, "
+          f"client {args.think * 1000:.0f} ms, {args.abandon:.0%} abandonnées\n")
+
+    random.seed(42)
+    latencies, calls, _ = measure(args, None)
+    report("sans préchargement", latencies, calls)
+
+    random.seed(42)
+    prefetcher = Prefetcher(max_in_flight=args.max_in_flight)
+    latencies, calls, _ = measure(args, prefetcher)
+    report("avec préchargement", latencies, calls)
+
+    stats = prefetcher.stats()
+    print(f"\n📊 Préchargements : {stats['submitted']} lancés, {stats['rejected']} refusés (limite), "
+          f"utilisés {stats['hit_rate']:.1%} (dont {stats['waited']} encore en cours), "
+          f"perdus {stats['waste_rate']:.1%} ({stats['wasted']} générés, {stats['cancelled']} annulés)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# scripts/score_leads.py
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+
+# Chemins
+PROJECT_ROOT = Path(__file__).parent.parent
+DATA_PATH = PROJECT_ROOT / "data" / "cleaned_synthetic_conversations.json"
+QUESTIONS_PATH = PROJECT_ROOT / "chatbot" / "questions.json"
+
+# État de chaque processus du pool (initialisé une fois par _init_worker)
+_worker = {}
+
+
+def client_messages(conv):
+    return [
+        msg["text"] for msg in conv.get("messages", [])
+        if isinstance(msg, dict) and msg.get("sender_type") == "contact" and msg.get("text")
+    ]
+
+
+def iter_source(source, path=DATA_PATH, batch_size=500):
+    """(identifiant, messages client, statut enregistré) de chaque conversation, en flux"""
+    if source == "mongo":
+        from database.mongo_client import iter_leads
+        for conv in iter_leads(batch_size=batch_size):
+            yield conv["_id"], client_messages(conv), conv.get("status")
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            conversations = json.load(f)
+        for i, conv in enumerate(conversations):
+            yield f"json:{i}", client_messages(conv), conv.get("status")
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _init_worker(questions_file):
+    """Chargé une fois par processus : modèle publié (sans base Q/R) et matchers compilés"""
+    from chatbot.knowledge_base import build_snapshot
+    from models.predictor import StatusPredictor
+    from models.scoring_system import compile_matchers
+
+    with open(questions_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    _worker["predictor"] = StatusPredictor(snapshot=build_snapshot(conversations=()))
+    _worker["questions"] = data["questions"]
+    _worker["threshold"] = data.get("qualification_threshold", 60)
+    _worker["matchers"] = compile_matchers(data["questions"])
+
+
+def score_chunk(chunk):
+    """Note un lot de conversations : un seul appel au modèle pour tout le lot"""
+    from models.scoring_system import qualification_status
+
+    predictor, matchers = _worker["predictor"], _worker["matchers"]
+    predictions = predictor.predict_batch([messages for _, messages, _ in chunk])
+
+    results = []
+    for (conversation_id, messages, stored_status), (status, confidence) in zip(chunk, predictions):
+        # Comme dans le questionnaire, un message ne répond qu'à une seule question :
+        # chaque question prend, dans l'ordre, sa meilleure occurrence parmi les messages restants
+        question_scores, matched = {}, {}
+        remaining = list(range(len(messages)))
+        for question, matcher in zip(_worker["questions"], matchers):
+            best = matcher.best_match_many([messages[i] for i in remaining])
+            question_scores[question["field"]] = best[1].score if best else matcher.default_score
+            if best:
+                index = remaining.pop(best[0])
+                matched[question["field"]] = {"message": index, **best[1]._asdict()}
+        total = sum(question_scores.values())
+        results.append({
+            "_id": conversation_id,
+            "stored_status": stored_status,
+            "predicted_status": str(status),
+            "confidence": round(float(confidence), 4),
+            "qualification_score": total,
+            "qualification_status": qualification_status(total, _worker["threshold"]),
+            "question_scores": question_scores,
+            "keyword_matches": matched,
+            "messages": len(messages),
+        })
+    return results
+
+
+def _has_module(name):
+    import importlib.util
+    return importlib.util.find_spec(name) is not None
+
+
+class ResultWriter:
+    """Écrit les résultats au fil de l'eau : JSONL, Parquet ou bulk_write MongoDB"""
+
+    def __init__(self, output=None, write_back=False, field="scoring"):
+        self.output = Path(output) if output else None
+        self.write_back = write_back
+        self.field = field
+        self.rows = []  # Parquet : écrit en une fois à la fin
+        self._jsonl = None
+        if self.output and self.output.suffix == ".jsonl":
+            self._jsonl = open(self.output, "w", encoding="utf-8")
+        elif self.output and self.output.suffix == ".parquet":
+            if not any(_has_module(name) for name in ("pyarrow", "fastparquet")):
+                raise SystemExit("❌ Sortie Parquet : installer pyarrow ou fastparquet (ou utiliser .jsonl)")
+        elif self.output:
+            raise SystemExit("❌ Sortie attendue : .jsonl ou .parquet")
+
+    def write(self, results):
+        if self._jsonl:
+            for row in results:
+                self._jsonl.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        elif self.output:
+            self.rows.extend(results)
+        if self.write_back:
+            from pymongo import UpdateOne
+            from database.mongo_client import leads_collection
+            leads_collection.bulk_write([
+                UpdateOne({"_id": row["_id"]}, {"$set": {self.field: {
+                    k: v for k, v in row.items() if k not in ("_id", "stored_status")
+                }}})
+                for row in results
+            ], ordered=False)
+
+    def close(self):
+        if self._jsonl:
+            self._jsonl.close()
+        elif self.output:
+            import pandas as pd
+            frame = pd.DataFrame(self.rows)
+            frame["_id"] = frame["_id"].astype(str)
+            for column in ("question_scores", "keyword_matches"):
+                frame[column] = frame[column].map(lambda v: json.dumps(v, ensure_ascii=False))
+            frame.to_parquet(self.output, index=False)  # nécessite pyarrow ou fastparquet
+
+
+def run(source, path, output, write_back, workers, chunk_size, questions_file=QUESTIONS_PATH):
+    writer = ResultWriter(output, write_back)
+    totals = {"scored": 0, "agree": 0}
+    start = time.perf_counter()
+
+    def collect(future):
+        results = future.result()
+        writer.write(results)
+        totals["scored"] += len(results)
+        totals["agree"] += sum(r["predicted_status"] == r["stored_status"] for r in results)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(str(questions_file),)) as pool:
+        pending = set()
+        for chunk in iter_chunks(iter_source(source, path), chunk_size):
+            # Au plus 2 lots en attente par processus : la lecture ne devance pas le calcul
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+            pending.add(pool.submit(score_chunk, chunk))
+
+        for future in pending:
+            collect(future)
+
+    writer.close()
+    elapsed = time.perf_counter() - start
+    scored, agree = totals["scored"], totals["agree"]
+    print(f"✅ {scored} conversations notées en {elapsed:.2f}s "
+          f"({scored / elapsed if elapsed else 0:.0f} conversations/s, {workers} processus)")
+    if scored:
+        print(f"📊 Statut prédit = statut enregistré : {agree / scored:.1%}")
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Note en masse les conversations enregistrées")
+    parser.add_argument("--source", choices=["json", "mongo"], default="json")
+    parser.add_argument("--path", default=str(DATA_PATH), help="Fichier JSON (source json)")
+    parser.add_argument("--output", help="Fichier de résultats .jsonl ou .parquet")
+    parser.add_argument("--write-back", action="store_true",
+                        help="Écrit les résultats dans MongoDB (champ 'scoring', bulk_write)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=256, help="Conversations par lot (un appel modèle)")
+    args = parser.parse_args()
+
+    if args.write_back and args.source != "mongo":
+        parser.error("--write-back nécessite --source mongo")
+    if not args.output and not args.write_back:
+        parser.error("préciser --output et/ou --write-back")
+
+    print(f"🚀 Notation des conversations ({args.source}) avec {args.workers} processus")
+    run(args.source, args.path, args.output, args.write_back, args.workers, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# scripts/test_gemini_client.py
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from chatbot.http_client import CircuitBreaker, CircuitOpenError, PooledHttpClient
+
+
+class StubGemini(BaseHTTPRequestHandler):
+    """Faux serveur Gemini : rejoue une liste de statuts (puis 200), avec délai optionnel"""
+    protocol_version = "HTTP/1.1"  # keep-alive, comme l'API réelle
+    script = []
+    delay = 0.0
+    calls = 0
+
+    def do_POST(self):
+        StubGemini.calls += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(StubGemini.delay)
+        status = StubGemini.script.pop(0) if StubGemini.script else 200
+        body = json.dumps({"candidates": [{"content": {"parts": [{"text": "Ahla !"}]}}]}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass  # le client a abandonné (test du timeout)
+
+    def log_message(self, *args):
+        pass
+
+
+def reset(script=(), delay=0.0):
+    StubGemini.script = list(script)
+    StubGemini.delay = delay
+    StubGemini.calls = 0
+
+
+def run_checks():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGemini)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/generate"
+
+    def new_client(**kwargs):
+        options = dict(max_retries=2, backoff_base=0.01, backoff_max=0.05,
+                       breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+        options.update(kwargs)
+        return PooledHttpClient(**options)
+
+    # 1. 503, 429 puis 200 → succès après 2 nouvelles tentatives
+    reset([503, 429])
+    client = new_client()
+    result = client.post_json(url, {"contents": []})
+    assert result["candidates"][0]["content"]["parts"][0]["text"] == "Ahla !"
+    assert StubGemini.calls == 3 and client.retries == 2
+    print("✅ Tentatives avec backoff sur 429/5xx")
+
+    # 2. Échecs répétés → le disjoncteur s'ouvre et court-circuite les appels
+    reset([500] * 6)
+    for _ in range(2):
+        try:
+            client.post_json(url, {})
+        except Exception:
+            pass
+    calls_before = StubGemini.calls
+    try:
+        client.post_json(url, {})
+        raise AssertionError("le disjoncteur aurait dû être ouvert")
+    except CircuitOpenError:
+        pass
+    assert StubGemini.calls == calls_before and client.breaker.state == "open"
+    print("✅ Disjoncteur ouvert après échecs consécutifs")
+
+    # 3. Après le délai, un appel d'essai réussi referme le disjoncteur
+    time.sleep(0.25)
+    reset()
+    client.post_json(url, {})
+    assert client.breaker.state == "closed"
+    print("✅ Disjoncteur refermé après un essai réussi")
+
+    # 4. Essai half-open interrompu (déconnexion, annulation) → l'essai suivant est autorisé
+    class Abandoned(BaseException):
+        pass
+
+    def abandon(*args, **kwargs):
+        raise Abandoned()
+
+    reset([500] * 6)
+    for _ in range(2):
+        try:
+            client.post_json(url, {})
+        except Exception:
+            pass
+    assert client.breaker.state == "open"
+    time.sleep(0.25)
+    session_post, client.session.post = client.session.post, abandon
+    try:
+        client.post_json(url, {})
+    except Abandoned:
+        pass
+    client.session.post = session_post
+    reset()
+    client.post_json(url, {})
+    assert client.breaker.state == "closed"
+    print("✅ Essai interrompu sans bloquer le disjoncteur")
+
+    # 5. Timeout de lecture
+    reset(delay=0.3)
+    slow_client = new_client(read_timeout=0.1, max_retries=0)
+    try:
+        slow_client.post_json(url, {})
+        raise AssertionError("timeout attendu")
+    except Exception as e:
+        assert "timed out" in str(e).lower(), e
+    print("✅ Timeout de lecture respecté")
+
+    print(f"\n📊 Statistiques : {client.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    run_checks()
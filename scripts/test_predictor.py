@@ -1,29 +1,23 @@
 # scripts/test_model.py
-import joblib
-import os
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 import numpy as np
-from pathlib import Path
 
-# Chemins
-PROJECT_ROOT = Path(__file__).parent.parent
-MODEL_PATH = PROJECT_ROOT / "models" / "saved" / "status_predictor.pkl"
-
-# Importer la connexion à MongoDB
-from database.mongo_client import get_all_leads
+# Importer la connexion à MongoDB et le registre des modèles
+from database.mongo_client import VALID_STATUSES, iter_leads
+from models.registry import load_model as load_published_model, model_exists, model_location
 
 def load_model():
     """Charge le modèle sauvegardé"""
-    if not os.path.exists(MODEL_PATH):
-        print(f"❌ Modèle non trouvé : {MODEL_PATH}")
+    if not model_exists():
+        print(f"❌ Modèle non trouvé : {model_location()}")
         print("   → Lance d'abord : python scripts/train_model.py")
         return None, None
 
     try:
-        data = joblib.load(MODEL_PATH)
+        data, version = load_published_model()
         model = data["model"]
         vectorizer = data["vectorizer"]
-        print(f"✅ Modèle chargé depuis : {MODEL_PATH}")
+        print(f"✅ Modèle chargé depuis : {model_location()} (version {version})")
         return model, vectorizer
     except Exception as e:
         print(f"❌ Erreur de chargement : {e}")
@@ -34,20 +28,10 @@ def generate_test_data():
     """Génère les données de test depuis MongoDB"""
     print("🔍 Chargement des données de test depuis MongoDB...")
 
-    conversations = get_all_leads()
-    if not conversations:
-        print("❌ Aucune conversation trouvée dans MongoDB")
-        return None, None
-
     X, y_true = [], []
 
-    valid_statuses = {"Qualified", "To follow up", "Unqualified"}
-
-    for conv in conversations:
-        status = conv.get("status")
-        if not status or status not in valid_statuses:
-            continue
-
+    for conv in iter_leads(statuses=VALID_STATUSES):
+        status = conv["status"]
         client_msgs = [
             msg["text"] for msg in conv.get("messages", [])
             if isinstance(msg, dict) and msg.get("sender_type") == "contact" and msg.get("text")
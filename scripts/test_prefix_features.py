@@ -0,0 +1,87 @@
+# scripts/test_prefix_features.py
+import json
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from models.prefix_features import PrefixTfidfFeaturizer, prefix_texts
+from models.train_predictor import TFIDF_PARAMS
+
+DATA_PATH = Path(__file__).parent.parent / "data" / "cleaned_synthetic_conversations.json"
+
+
+def load_conversations():
+    """Messages client des conversations d'exemple (même filtre que generate_training_data)"""
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    conversations = []
+    for conv in data:
+        client_msgs = [
+            msg["text"] for msg in conv.get("messages", [])
+            if isinstance(msg, dict) and msg.get("sender_type") == "contact" and msg.get("text")
+        ]
+        if client_msgs:
+            conversations.append(client_msgs)
+    return conversations
+
+
+def synthetic_conversations(count=300, seed=0):
+    """Cas limites : messages sans token, chiffres, majuscules, conversations longues"""
+    rng = random.Random(seed)
+    words = ["bac", "Bac", "3andi", "10.5", "moyenne", "!!!", "aslema", "ok", "", "ma", "na3ref", "?", "2024"]
+    return [
+        [" ".join(rng.choice(words) for _ in range(rng.randint(0, 6))) or "..."
+         for _ in range(rng.randint(1, 25))]
+        for _ in range(count)
+    ]
+
+
+def assert_same(conversations, params, label):
+    texts = [text for messages in conversations for text in prefix_texts(messages)]
+
+    start = time.perf_counter()
+    reference = TfidfVectorizer(**params)
+    expected = reference.fit_transform(texts)
+    reference_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    featurizer = PrefixTfidfFeaturizer(TfidfVectorizer(**params))
+    actual = featurizer.fit_transform(conversations)
+    prefix_seconds = time.perf_counter() - start
+
+    vectorizer = featurizer.vectorizer
+    assert vectorizer.vocabulary_ == reference.vocabulary_, "vocabulaire différent"
+    assert np.array_equal(vectorizer.idf_, reference.idf_), "idf différent"
+    assert actual.shape == expected.shape
+    assert np.array_equal(actual.indptr, expected.indptr) and np.array_equal(actual.indices, expected.indices)
+    assert np.array_equal(actual.data, expected.data), "valeurs TF-IDF différentes"
+    # Le vectorizer produit doit transformer un texte joint comme l'original
+    assert (vectorizer.transform(texts[:50]) != reference.transform(texts[:50])).nnz == 0
+    head = conversations[:20]
+    head_texts = [text for messages in head for text in prefix_texts(messages)]
+    transformed, expected_head = featurizer.transform(head), reference.transform(head_texts)
+    assert np.array_equal(transformed.indices, expected_head.indices)
+    assert np.array_equal(transformed.data, expected_head.data)
+
+    print(f"✅ {label} : {actual.shape[0]} préfixes, {actual.shape[1]} features, matrice identique "
+          f"(fit_transform {reference_seconds:.2f}s → préfixes {prefix_seconds:.2f}s)")
+
+
+def run_checks():
+    assert_same(load_conversations(), TFIDF_PARAMS, "Conversations d'exemple")
+    assert_same(synthetic_conversations(), TFIDF_PARAMS, "Cas limites")
+    assert_same(synthetic_conversations(seed=1), dict(TFIDF_PARAMS, ngram_range=(2, 3), max_features=50,
+                                                      min_df=2, sublinear_tf=True), "Autres paramètres")
+
+    # Conversations longues : le texte joint croît en O(n²), la featurisation en O(n)
+    rng = random.Random(42)
+    vocabulary = [f"mot{i}" for i in range(2000)]
+    long_conversations = [[" ".join(rng.choices(vocabulary, k=12)) for _ in range(200)] for _ in range(20)]
+    assert_same(long_conversations, TFIDF_PARAMS, "Conversations de 200 messages")
+
+
+if __name__ == "__main__":
+    run_checks()